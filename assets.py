@@ -0,0 +1,99 @@
+import os
+import threading
+
+import pygame
+
+IMAGES = ('background.png', 'black_background.png', 'flickering_arrow_l.png', 'flickering_arrow_r.png',
+          'game_background.png', 'logo.png', 'tile1.png', 'tile2.png', 'tile3.png')
+SOUNDS = ('game_end.ogg', 'letter_move.ogg', 'letter_place.ogg', 'menu_chose.ogg', 'menu_move.ogg',
+          'new_highscore.ogg', 'pause.ogg', 'rotate.ogg')
+FONTS = (('PressStart2P.ttf', 30), ('PressStart2P.ttf', 34))
+
+
+def load_image(name, colorkey=None):
+    fullname = os.path.join('data', name)
+    try:
+        image = pygame.image.load(fullname)
+    except pygame.error as message:
+        print('Cannot load image:', name)
+        raise SystemExit(message)
+    image = image.convert_alpha()
+    if colorkey is not None:
+        if colorkey is -1:
+            colorkey = image.get_at((0, 0))
+        image.set_colorkey(colorkey)
+    return image
+
+
+class Assets:
+    # every image, sound and font is loaded once and shared by all users
+    def __init__(self):
+        self.images = {}  # (name, size) -> surface, size is None for the original image
+        self.sounds = {}
+        self.fonts = {}  # (name, size) -> font
+        # decoded images that still have to be converted for the display
+        self.raw_images = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def image(self, name, size=None):
+        key = (name, size)
+        image = self.images.get(key)
+        if image is None:
+            if size is not None:
+                image = pygame.transform.scale(self.image(name), size)
+            else:
+                with self.lock:
+                    raw_image = self.raw_images.pop(name, None)
+                image = load_image(name) if raw_image is None else raw_image.convert_alpha()
+            self.images[key] = image
+        return image
+
+    def sound(self, name):
+        with self.lock:
+            sound = self.sounds.get(name)
+            if sound is None:
+                sound = pygame.mixer.Sound(os.path.join('data', name))
+                self.sounds[name] = sound
+        return sound
+
+    def font(self, name, size):
+        key = (name, size)
+        with self.lock:
+            font = self.fonts.get(key)
+            if font is None:
+                font = pygame.font.Font(os.path.join('font', name), size)
+                self.fonts[key] = font
+        return font
+
+    def load(self, images=IMAGES, sounds=SOUNDS, fonts=FONTS):
+        for name in images:
+            with self.lock:
+                if name in self.raw_images or (name, None) in self.images:
+                    continue
+            # decoding doesn't need the display, converting is done in image()
+            raw_image = pygame.image.load(os.path.join('data', name))
+            with self.lock:
+                self.raw_images[name] = raw_image
+        for name in sounds:
+            self.sound(name)
+        for name, size in fonts:
+            self.font(name, size)
+
+    def preload(self, background=False):
+        # with background=True the files are decoded in a thread, call wait() before using them
+        if background:
+            self.thread = threading.Thread(target=self.load, daemon=True)
+            self.thread.start()
+        else:
+            self.load()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for name in list(self.raw_images):
+            self.image(name)
+
+
+assets = Assets()
@@ -0,0 +1,72 @@
+import pygame
+
+from shapes import FlyingLetter
+
+# letter index -> tile image, the three tiles of the original game
+LETTER_TILES = ('tile1.png', 'tile2.png', 'tile3.png', 'tile1.png', 'tile2.png', 'tile3.png', 'tile1.png')
+# letter index -> color the tile is multiplied by, None keeps the tile as it is
+TINTS = (None, None, None, None, None, None, None)
+SLOT = 4  # tiles per side of the place of one whole letter in the atlas
+COLORKEY = (255, 0, 255)  # empty cells of the letter pictures, the tiles are opaque
+
+
+class TileAtlas:
+    # one surface with a tile for every letter and a picture of every letter in every angle,
+    # all of one tile size, indexing it gives the tile of a letter like the old list of blocks
+    def __init__(self, assets, size, tiles=LETTER_TILES, tints=TINTS):
+        self.size = size
+        letters_num = len(FlyingLetter.letters)
+        width = max(letters_num, SLOT * 4) * size
+        height = size + letters_num * SLOT * size
+        # an opaque surface with a color key blits faster than per pixel alpha
+        self.surface = pygame.Surface((width, height))
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        self.surface.fill(COLORKEY)
+        self.surface.set_colorkey(COLORKEY)
+
+        # first row: the tiles
+        self.blocks = []
+        tiles_list = []
+        for index in range(letters_num):
+            tile = assets.image(tiles[index], (size, size))
+            if tints[index] is not None:
+                tile = tile.copy()
+                tile.fill(tints[index], special_flags=pygame.BLEND_RGB_MULT)
+            self.surface.blit(tile, (index * size, 0))
+            tiles_list.append(tile)
+            self.blocks.append(self.surface.subsurface(index * size, 0, size, size))
+
+        # then a row of slots for every letter, one slot per angle;
+        # letter -> angle -> (surface, offset of its top left corner from the center block)
+        self.letters = []
+        for index in range(letters_num):
+            angles = []
+            for angle, offsets in enumerate(FlyingLetter.cells[index]):
+                first_row = min(i for i, j in offsets)
+                first_column = min(j for i, j in offsets)
+                rows_num = max(i for i, j in offsets) - first_row + 1
+                columns_num = max(j for i, j in offsets) - first_column + 1
+                x = angle * SLOT * size
+                y = size + index * SLOT * size
+                for i, j in offsets:
+                    self.surface.blit(tiles_list[index], (x + (j - first_column) * size, y + (i - first_row) * size))
+                letter = self.surface.subsurface(x, y, columns_num * size, rows_num * size)
+                angles.append((letter, (first_column * size, first_row * size)))
+            self.letters.append(angles)
+
+    def __getitem__(self, index):
+        return self.blocks[index]
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def show_letter(self, screen, index, angle, coord):
+        # coord is the pixel position of the center block
+        letter, (offset_x, offset_y) = self.letters[index][angle]
+        screen.blit(letter, (coord[0] + offset_x, coord[1] + offset_y))
+
+
+def build_atlases(assets, sizes, tiles=LETTER_TILES, tints=TINTS):
+    # tile size -> atlas, made once at startup for all the sizes the game can use
+    return {size: TileAtlas(assets, size, tiles, tints) for size in sizes}
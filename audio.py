@@ -0,0 +1,76 @@
+import io
+import os
+
+import pygame
+
+# sound name -> (file, category)
+SOUNDS = {'menu_move': ('menu_move.ogg', 'menu'),
+          'menu_chose': ('menu_chose.ogg', 'menu'),
+          'pause': ('pause.ogg', 'menu'),
+          'letter_move': ('letter_move.ogg', 'move'),
+          'rotate': ('rotate.ogg', 'move'),
+          'letter_place': ('letter_place.ogg', 'game'),
+          'game_end': ('game_end.ogg', 'game'),
+          'new_highscore': ('new_highscore.ogg', 'game')}
+# category -> number of channels reserved for it
+CHANNELS = {'menu': 1, 'move': 2, 'game': 2}
+MUSIC = 'korobeiniki.ogg'
+MUSIC_VOLUME = 0.5
+
+
+class Audio:
+    # sounds asked for with play() are started together by flush(), once per frame,
+    # a sound asked for several times in one frame is played once
+    def __init__(self, assets, sounds=SOUNDS, channels=CHANNELS):
+        self.sounds = {name: (assets.sound(filename), category) for name, (filename, category) in sounds.items()}
+
+        # every category gets its own channels, Sound.play() elsewhere can't take them
+        channels_num = sum(channels.values())
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), channels_num))
+        pygame.mixer.set_reserved(channels_num)
+        self.channels = {}
+        self.next_channel = {}
+        first_channel = 0
+        for category, number in channels.items():
+            self.channels[category] = [pygame.mixer.Channel(first_channel + i) for i in range(number)]
+            self.next_channel[category] = 0
+            first_channel += number
+
+        self.queue = []
+        self.music_data = {}  # file -> contents, the music is streamed from memory
+        self.music = None
+
+    def play(self, name):
+        if name not in self.queue:
+            self.queue.append(name)
+
+    def flush(self):
+        for name in self.queue:
+            sound, category = self.sounds[name]
+            channels = self.channels[category]
+            # a free channel of the category, the one used longest ago if all are busy
+            for channel in channels:
+                if not channel.get_busy():
+                    break
+            else:
+                index = self.next_channel[category]
+                channel = channels[index]
+                self.next_channel[category] = (index + 1) % len(channels)
+            channel.play(sound)
+        self.queue = []
+
+    def play_music(self, name=MUSIC, loops=-1):
+        # the file is read once, later calls only start the loaded music again
+        if self.music != name:
+            data = self.music_data.get(name)
+            if data is None:
+                with open(os.path.join('data', name), 'rb') as file:
+                    data = file.read()
+                self.music_data[name] = data
+            pygame.mixer.music.load(io.BytesIO(data), os.path.splitext(name)[1][1:])
+            pygame.mixer.music.set_volume(MUSIC_VOLUME)
+            self.music = name
+        pygame.mixer.music.play(loops)
+
+    def stop_music(self):
+        pygame.mixer.music.stop()
@@ -0,0 +1,281 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from engine import COLUMNS, DIFFICULTY, LEVEL_SCORE, MOVE_TIME, ROWS, Game, Randomizer, seconds_to_ticks
+from shapes import FlyingLetter
+
+# letter index, angle, block, (row offset, column offset)
+CELLS = np.array(FlyingLetter.cells, dtype=np.int64)
+# score for 0..4 cleared rows, same table as Grid.update
+SCORES = np.array([0, 100, 300, 700, 1500], dtype=np.int64)
+MAX_LEVEL = 64  # the move time is one tick long before this level
+# level -> ticks between two moves down, same as Game.get_move_ticks
+MOVE_TICKS = np.array([0] + [seconds_to_ticks(MOVE_TIME * DIFFICULTY ** (level - 1))
+                             for level in range(1, MAX_LEVEL + 1)], dtype=np.int64)
+STREAM_CHUNK = 256  # letters generated at once for every game
+NO_ACTION = -1
+
+
+class BatchGame:
+    # runs many independent games in lock-step with the same rules as engine.Game,
+    # all boards are kept in one (games, rows, columns) array
+    def __init__(self, seeds, columns=COLUMNS, rows=ROWS):
+        self.size = len(seeds)
+        self.columns = columns
+        self.rows = rows
+        self.spawn_position = (1, columns // 2)
+        self.randomizers = [Randomizer(len(FlyingLetter.letters), seed) for seed in seeds]
+
+        # color indexes, empty -> -1
+        self.boards = np.full((self.size, rows, columns), -1, dtype=np.int8)
+        self.score = np.zeros(self.size, dtype=np.int64)
+        self.level = np.ones(self.size, dtype=np.int64)
+        self.game_over = np.zeros(self.size, dtype=bool)
+        self.ticks = 0
+
+        # letters of every game, generated in chunks
+        self.stream = np.zeros((self.size, STREAM_CHUNK), dtype=np.int64)
+        self.stream_position = np.zeros(self.size, dtype=np.int64)
+        for game_index in range(self.size):
+            self.fill_stream(game_index)
+
+        # current letter
+        self.letter_index = self.take_letters()
+        self.angle = np.zeros(self.size, dtype=np.int64)
+        self.row = np.full(self.size, self.spawn_position[0], dtype=np.int64)
+        self.column = np.full(self.size, self.spawn_position[1], dtype=np.int64)
+        self.elapsed_ticks = np.zeros(self.size, dtype=np.int64)
+        self.normal_move_ticks = MOVE_TICKS[self.level]
+        self.move_ticks = self.normal_move_ticks.copy()
+        self.dropping = np.zeros(self.size, dtype=bool)
+        self.next_letter_index = self.take_letters()
+
+        self.all_games = np.arange(self.size)
+
+    def fill_stream(self, game_index):
+        self.stream[game_index] = self.randomizers[game_index].generate(STREAM_CHUNK)
+        self.stream_position[game_index] = 0
+
+    def take_letters(self, games=None):
+        # next letter index of the given games (all by default)
+        if games is None:
+            games = np.arange(self.size)
+        for game_index in games[self.stream_position[games] == STREAM_CHUNK]:
+            self.fill_stream(game_index)
+        letters = self.stream[games, self.stream_position[games]]
+        self.stream_position[games] += 1
+        return letters
+
+    def get_cells(self, games, letter_index, angle, row, column):
+        # (games, 4) arrays of the rows and columns taken by the letters
+        offsets = CELLS[letter_index, angle]
+        return row[:, None] + offsets[:, :, 0], column[:, None] + offsets[:, :, 1]
+
+    def collided(self, games, rows, columns):
+        # same as Grid.collided, rows below the grid collide
+        below = rows >= self.rows
+        taken = self.boards[games[:, None], np.minimum(rows, self.rows - 1), columns % self.columns] >= 0
+        return (below | taken).any(axis=1)
+
+    def is_out_of_bounds(self, columns):
+        return ((columns < 0) | (columns >= self.columns)).any(axis=1)
+
+    def act(self, actions):
+        # actions holds one Game action per game, NO_ACTION to skip a game
+        actions = np.asarray(actions)
+        active = ~self.game_over
+        for action, d_column, d_angle in ((Game.MOVE_LEFT, -1, 0), (Game.MOVE_RIGHT, 1, 0),
+                                          (Game.ROTATE_CW, 0, 1), (Game.ROTATE_CCW, 0, -1)):
+            games = self.all_games[(actions == action) & active]
+            if not len(games):
+                continue
+            column = self.column[games] + d_column
+            angle = (self.angle[games] + d_angle) % 4
+            rows, columns = self.get_cells(games, self.letter_index[games], angle, self.row[games], column)
+            valid = ~(self.is_out_of_bounds(columns) | self.collided(games, rows, columns))
+            games = games[valid]
+            self.column[games] = column[valid]
+            self.angle[games] = angle[valid]
+
+        games = self.all_games[(actions == Game.SPEED_UP) & active]
+        self.move_ticks[games] = FlyingLetter.fast_move_ticks
+        games = self.all_games[(actions == Game.RESET_SPEED) & active]
+        self.move_ticks[games] = self.normal_move_ticks[games]
+
+        games = self.all_games[(actions == Game.HARD_DROP) & active]
+        if len(games):
+            self.row[games] = self.get_landing_rows(games)
+            self.dropping[games] = True
+
+    def get_landing_rows(self, games):
+        letter_index, angle, row, column = (self.letter_index[games], self.angle[games],
+                                            self.row[games], self.column[games])
+        rows, columns = self.get_cells(games, letter_index, angle, row, column)
+        # a letter that overlaps the blocks can't fall
+        falling = ~self.collided(games, rows, columns)
+        row = row.copy()
+        while falling.any():
+            indexes = np.flatnonzero(falling)
+            rows, columns = self.get_cells(games[indexes], letter_index[indexes], angle[indexes],
+                                           row[indexes] + 1, column[indexes])
+            free = ~self.collided(games[indexes], rows, columns)
+            row[indexes[free]] += 1
+            falling[indexes[~free]] = False
+        return row
+
+    def tick(self):
+        # advance all running games by one tick, returns the mask of games that placed a letter
+        self.ticks += 1
+        active = ~self.game_over
+        falling = active & ~self.dropping
+        self.elapsed_ticks[falling] += 1
+        moved = falling & (self.elapsed_ticks >= self.move_ticks)
+        self.elapsed_ticks[moved] = 0
+        self.row[moved] += 1
+
+        games = self.all_games[falling]
+        rows, columns = self.get_cells(games, self.letter_index[games], self.angle[games],
+                                       self.row[games], self.column[games])
+        placed = np.zeros(self.size, dtype=bool)
+        placed[games[self.collided(games, rows, columns)]] = True
+        self.row[placed] -= 1
+        # dropped letters may have been moved or rotated after the drop, they land again from there
+        dropped = active & self.dropping
+        games = self.all_games[dropped]
+        if len(games):
+            self.row[games] = self.get_landing_rows(games)
+        placed |= dropped
+        self.dropping[:] = False
+
+        games = self.all_games[placed]
+        if len(games):
+            self.place(games)
+        return placed
+
+    def place(self, games):
+        rows, columns = self.get_cells(games, self.letter_index[games], self.angle[games],
+                                       self.row[games], self.column[games])
+        inside = (rows >= 0) & (columns >= 0)
+        self.boards[np.broadcast_to(games[:, None], rows.shape)[inside], rows[inside], columns[inside]] = \
+            np.broadcast_to(self.letter_index[games, None], rows.shape)[inside]
+        self.game_over[games] |= (rows == 0).any(axis=1)
+
+        # full rows are moved to the top and emptied, the order of the other rows is kept
+        boards = self.boards[games]
+        full_rows = (boards >= 0).all(axis=2)
+        cleared = full_rows.sum(axis=1)
+        if cleared.any():
+            order = np.argsort(~full_rows, axis=1, kind='stable')
+            boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+            boards[np.arange(self.rows)[None, :] < cleared[:, None]] = -1
+            self.boards[games] = boards
+        self.score[games] += SCORES[cleared]
+
+        # increase difficulty level every time 1500 points are claimed
+        level_up = self.score[games] / LEVEL_SCORE >= self.level[games]
+        self.level[games[level_up]] += 1
+
+        # the next letter comes into play
+        self.letter_index[games] = self.next_letter_index[games]
+        self.angle[games] = 0
+        self.row[games] = self.spawn_position[0]
+        self.column[games] = self.spawn_position[1]
+        self.elapsed_ticks[games] = 0
+        self.normal_move_ticks[games] = MOVE_TICKS[np.minimum(self.level[games], MAX_LEVEL)]
+        self.move_ticks[games] = self.normal_move_ticks[games]
+        self.next_letter_index[games] = self.take_letters(games)
+
+    def step(self, actions=None):
+        if actions is not None:
+            self.act(actions)
+        return self.tick()
+
+    def is_finished(self):
+        return self.game_over.all()
+
+    def get_state(self, game_index):
+        # same tuple as get_game_state() of the matching engine.Game
+        return (self.boards[game_index].tolist(), int(self.score[game_index]), int(self.level[game_index]),
+                bool(self.game_over[game_index]), int(self.letter_index[game_index]), int(self.angle[game_index]),
+                int(self.row[game_index]), int(self.column[game_index]), int(self.elapsed_ticks[game_index]),
+                int(self.move_ticks[game_index]), int(self.normal_move_ticks[game_index]),
+                int(self.next_letter_index[game_index]))
+
+
+def get_game_state(game):
+    letter = game.current_letter
+    return (game.grid.grid, game.get_score(), game.level, game.is_game_over(), letter.random_index,
+            letter.current_angle, letter.row, letter.column, letter.elapsed_ticks, letter.move_ticks,
+            letter.normal_move_ticks, game.next_letter.random_index)
+
+
+def check(seeds, bot_name='bots:greedy_bot', max_ticks=20000, noise=0.2):
+    # plays the same seeds with engine.Game and BatchGame tick by tick and compares them after every tick,
+    # the bot plays the engine games and its actions are sent to both, one action per tick;
+    # with the given probability a random move follows a hard drop in the same tick.
+    # Returns None if all games matched, else (tick, seed, engine state, batch state)
+    from tournament import load_bot
+    bot = load_bot(bot_name)
+    generator = random.Random(0)
+    games = [Game(seed=seed) for seed in seeds]
+    batch = BatchGame(seeds)
+    pending = [[] for game in games]  # actions of the current letter of every game
+    for game, actions in zip(games, pending):
+        actions.extend(bot(game))
+    while not batch.is_finished() and batch.ticks < max_ticks:
+        rounds = [[NO_ACTION] * len(games), [NO_ACTION] * len(games)]
+        for game_index, game in enumerate(games):
+            if game.is_game_over() or not pending[game_index]:
+                continue
+            action = pending[game_index].pop(0)
+            rounds[0][game_index] = action
+            if action == Game.HARD_DROP and generator.random() < noise:
+                rounds[1][game_index] = generator.choice((Game.MOVE_LEFT, Game.MOVE_RIGHT,
+                                                          Game.ROTATE_CW, Game.ROTATE_CCW))
+        for actions in rounds:
+            for game, action in zip(games, actions):
+                if action != NO_ACTION:
+                    game.act(action)
+            batch.act(actions)
+
+        for game_index, game in enumerate(games):
+            if not game.is_game_over() and game.tick() and not game.is_game_over():
+                pending[game_index] = list(bot(game))
+        batch.tick()
+        for game_index, game in enumerate(games):
+            state = get_game_state(game)
+            batch_state = batch.get_state(game_index)
+            if state != batch_state:
+                return batch.ticks, seeds[game_index], state, batch_state
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that BatchGame plays the same games as engine.Game')
+    parser.add_argument('--bot', default='bots:greedy_bot', help='module:function of the bot')
+    parser.add_argument('--games', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--max-ticks', type=int, default=20000, help='stop the check after this many ticks')
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    mismatch = check(list(range(args.seed, args.seed + args.games)), args.bot, args.max_ticks)
+    elapsed_time = time.perf_counter() - start_time
+    if mismatch is not None:
+        tick, seed, state, batch_state = mismatch
+        print('seed {0} differs after tick {1}'.format(seed, tick))
+        names = ('board', 'score', 'level', 'game over', 'letter', 'angle', 'row', 'column',
+                 'elapsed ticks', 'move ticks', 'normal move ticks', 'next letter')
+        for name, value, batch_value in zip(names, state, batch_state):
+            if value != batch_value:
+                print('{0}: engine {1}, batch {2}'.format(name, value, batch_value))
+        return 1
+    print('{0} games match, time: {1:.2f} s'.format(args.games, elapsed_time))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import time
+
+from engine import Game, Grid
+from shapes import FlyingLetter
+
+WARMUP = 2
+REPEAT = 7
+TIME_PER_RUN = 0.05  # seconds, used to pick the number of calls per run
+BOARD_SIZES = ((10, 20), (50, 100), (100, 200))
+FRAME_ACTIONS = (Game.MOVE_LEFT, Game.MOVE_RIGHT, Game.ROTATE_CW, Game.SPEED_UP, Game.HARD_DROP)
+
+
+def measure(func, setup=None, number=None, warmup=WARMUP, repeat=REPEAT):
+    # times func(arg) per call over several runs, setup() makes the argument of every call
+    # outside of the timed part
+    if number is None:
+        # calibrate so that one run takes about TIME_PER_RUN
+        number = 1
+        while True:
+            args = [setup() if setup else None for i in range(number)]
+            start = time.perf_counter()
+            for arg in args:
+                func(arg)
+            if time.perf_counter() - start >= TIME_PER_RUN / 10 or number >= 1 << 20:
+                break
+            number *= 2
+        number *= 10
+
+    runs = []
+    for run in range(warmup + repeat):
+        args = [setup() if setup else None for i in range(number)]
+        start = time.perf_counter()
+        for arg in args:
+            func(arg)
+        elapsed_time = time.perf_counter() - start
+        if run >= warmup:
+            runs.append(elapsed_time / number)
+    return {'mean_us': statistics.mean(runs) * 1e6, 'min_us': min(runs) * 1e6,
+            'stdev_us': statistics.stdev(runs) * 1e6 if len(runs) > 1 else 0.0,
+            'calls_per_run': number, 'runs': len(runs)}
+
+
+def make_grid(lines, seed=0):
+    # a grid with the bottom rows full except for column 0, an I letter dropped there clears `lines` rows
+    generator = random.Random(seed)
+    grid = Grid(10, 20)
+    for row_index in range(grid.rows - 8, grid.rows):
+        colors = [generator.randrange(7) for j in range(grid.columns)]
+        if row_index < grid.rows - lines or row_index == grid.rows - 8:
+            colors[generator.randrange(1, grid.columns)] = -1
+        colors[0] = -1
+        grid.set_row(row_index, colors)
+    return grid
+
+
+def bench_core(results):
+    grid = make_grid(0)
+    cells = [(5, 3), (5, 4), (5, 5), (6, 4)]
+    results['grid_collided'] = measure(lambda arg: grid.collided(cells))
+
+    vertical_i = [(grid.rows - 4 + i, 0) for i in range(4)]
+    for lines in range(5):
+        results['grid_update_{0}_lines'.format(lines)] = measure(
+            lambda grid: grid.update(vertical_i, 0), setup=lambda: make_grid(lines), number=500)
+
+    class Numbers:
+        def get_number(self):
+            return 2
+
+    letter = FlyingLetter((1, 5), 60, Numbers())
+
+    def rotate(arg):
+        letter.rotate_cw()
+        letter.get_cells()
+
+    results['letter_build'] = measure(lambda arg: letter.build())
+    results['letter_rotate'] = measure(rotate)
+
+
+def bench_games(results):
+    from bots import greedy_bot, random_bot
+
+    def play(bot, max_ticks):
+        def run(seed):
+            game = Game(seed=seed)
+            while not game.is_game_over() and game.ticks < max_ticks:
+                for action in bot(game):
+                    game.act(action)
+                while not game.tick() and game.ticks < max_ticks:
+                    pass
+            return game
+        return run
+
+    seeds = iter(range(1 << 30))
+    results['headless_game_random_bot'] = measure(play(random_bot, 100000), setup=lambda: next(seeds))
+    results['headless_game_greedy_bot_1000_ticks'] = measure(play(greedy_bot, 1000), setup=lambda: next(seeds),
+                                                            number=2, repeat=3)
+
+    def idle_game(arg):
+        # gravity only, no input
+        game = Game(seed=1)
+        while not game.is_game_over():
+            game.tick()
+
+    results['headless_game_no_input'] = measure(idle_game)
+
+
+def bench_render(results):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame
+
+    import main
+    from assets import assets
+
+    from atlas import TileAtlas
+
+    pygame.init()
+    screen = pygame.display.set_mode(main.resolution)
+    blocks = TileAtlas(assets, main.TILESIZE)
+    game_background = assets.image('game_background.png')
+    font = assets.font('PressStart2P.ttf', 34)
+
+    def make_render_grid(full, cached):
+        grid = main.Grid(main.columns, main.rows, (main.TILESIZE, main.TILESIZE))
+        if full:
+            for row_index in range(grid.rows):
+                grid.set_row(row_index, [(row_index + j) % 7 for j in range(grid.columns)])
+        if cached:
+            grid.init_surface(blocks, game_background)
+        return grid
+
+    for full in (False, True):
+        for cached in (False, True):
+            grid = make_render_grid(full, cached)
+            name = 'grid_show_{0}_{1}'.format('full' if full else 'empty', 'cached' if cached else 'uncached')
+            results[name] = measure(lambda arg: grid.show(screen, blocks))
+
+    class Numbers:
+        def get_number(self):
+            return 2
+
+    letter = FlyingLetter((5, 5), 60, Numbers())
+    tiles = list(blocks)
+    results['letter_show_tiles'] = measure(lambda arg: letter.show(screen, tiles, (100, 100)))
+    results['letter_show_atlas'] = measure(lambda arg: blocks.show_letter(screen, 2, 0, (100, 100)))
+
+    def write_uncached(arg):
+        main.text_cache.clear()
+        main.write(font, 'TIME 01:23', (255, 255, 255))
+
+    results['hud_write_cached'] = measure(lambda arg: main.write(font, 'TIME 01:23', (255, 255, 255)))
+    results['hud_write_uncached'] = measure(write_uncached)
+
+    grid = make_render_grid(False, False)
+    renderer = main.Renderer(screen, game_background, grid, blocks, font, (442, 430))
+    results['render_frame'] = measure(make_frame(grid, renderer), number=600, repeat=3)
+
+    # the cost of a frame and of a line clear shouldn't grow with the board
+    for columns, rows in BOARD_SIZES:
+        name = 'board_{0}x{1}'.format(columns, rows)
+        tile_size = main.get_tile_size(columns, rows)
+        atlas = TileAtlas(assets, tile_size)
+        grid = main.Grid(columns, rows, (tile_size, tile_size))
+        renderer = main.Renderer(screen, game_background, grid, atlas, font, (442, 430), None, blocks)
+        results[name + '_frame'] = measure(make_frame(grid, renderer, random.Random(0)), number=600, repeat=3)
+
+        def make_full_grid():
+            # four rows full except for column 0
+            grid = main.Grid(columns, rows, (tile_size, tile_size))
+            for row_index in range(rows - 4, rows):
+                grid.set_row(row_index, [-1] + [row_index % 7] * (columns - 1))
+            grid.init_surface(atlas, game_background)
+            return grid
+
+        vertical_i = [(rows - 4 + i, 0) for i in range(4)]
+        results[name + '_clear_4_lines'] = measure(lambda grid: grid.update(vertical_i, 0), setup=make_full_grid,
+                                                   number=20, repeat=3)
+
+
+def make_frame(grid, renderer, generator=None):
+    # one frame of the game loop: input, a tick and drawing, random moves if generator is given
+    games = [Game(grid, seed=1)]
+
+    def frame(arg):
+        game = games[0]
+        if game.is_game_over():
+            # start over on the same grid so that every frame draws a running game
+            for row_index in range(min(grid.column_tops), grid.rows):
+                grid.set_row(row_index, [-1] * grid.columns)
+            grid.game_over = False
+            game = games[0] = Game(grid, seed=game.ticks)
+        if generator is not None:
+            action = generator.randrange(16)
+            if action < len(FRAME_ACTIONS):
+                game.act(FRAME_ACTIONS[action])
+        game.tick()
+        renderer.set_text('score', str(game.get_score()), (413, 200))
+        renderer.set_text('time', 'TIME 00:{0:02d}'.format(game.ticks // 60 % 60), (18, 33))
+        renderer.draw(game.current_letter, game.next_letter, game.get_ghost_cells())
+    return frame
+
+
+def compare(results, baseline, threshold):
+    # prints the benchmarks that got slower than the baseline by more than threshold
+    slower = []
+    for name, result in sorted(results.items()):
+        if name in baseline:
+            ratio = result['min_us'] / baseline[name]['min_us']
+            print('{0:40} {1:8.2f}x'.format(name, ratio))
+            if ratio > 1 + threshold:
+                slower.append(name)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the game core and the renderer')
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--compare', help='json file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slow down when comparing')
+    parser.add_argument('--render', action='store_true', help='benchmark the pygame renderer as well')
+    args = parser.parse_args(argv)
+
+    results = {}
+    bench_core(results)
+    bench_games(results)
+    if args.render:
+        bench_render(results)
+
+    for name, result in sorted(results.items()):
+        print('{0:40} {1:12.2f} us  (min {2:.2f}, stdev {3:.2f})'.format(
+            name, result['mean_us'], result['min_us'], result['stdev_us']))
+
+    report = {'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print('slower than the baseline:', ', '.join(slower))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,63 @@
+import random
+
+from engine import Game
+from shapes import FlyingLetter
+
+# a bot is called once for every new letter with the game and returns the list of
+# Game actions for that letter, the letter falls on its own if there is no HARD_DROP
+
+
+def get_actions(rotations, shift):
+    # rotate first, then move sideways and drop
+    if rotations == 3:
+        actions = [Game.ROTATE_CCW]
+    else:
+        actions = [Game.ROTATE_CW] * rotations
+    if shift < 0:
+        actions += [Game.MOVE_LEFT] * -shift
+    else:
+        actions += [Game.MOVE_RIGHT] * shift
+    actions.append(Game.HARD_DROP)
+    return actions
+
+
+def random_bot(game):
+    # the choices depend only on the seed of the game and the letter, so seeded games repeat
+    generator = random.Random(game.randomizer.seed << 32 | game.letters_count)
+    return get_actions(generator.randrange(4), generator.randrange(-5, 6))
+
+
+def evaluate(grid, letter_index, angle, row, column):
+    # higher is better: few holes, low and flat surface, many cleared lines
+    offsets = FlyingLetter.cells[letter_index][angle]
+    column_tops = list(grid.column_tops)
+    holes = 0
+    for j, i in FlyingLetter.bottoms[letter_index][angle]:
+        holes += column_tops[column + j] - (row + i) - 1
+    for i, j in offsets:
+        column_tops[column + j] = min(column_tops[column + j], row + i)
+
+    lines = 0
+    rows_list = {row + i for i, j in offsets}
+    for row_index in rows_list:
+        bits = grid.row_bits[row_index]
+        for i, j in offsets:
+            if row + i == row_index:
+                bits |= 1 << (column + j)
+        if bits == grid.full_row_bits:
+            lines += 1
+
+    heights = [grid.rows - top for top in column_tops]
+    bumpiness = sum(abs(heights[k] - heights[k + 1]) for k in range(len(heights) - 1))
+    return 0.76 * lines - 0.51 * sum(heights) - 0.36 * holes - 0.18 * bumpiness
+
+
+def greedy_bot(game):
+    grid = game.grid
+    letter_index = game.current_letter.get_color_index()
+    best = None
+    for angle, column, row, actions in game.get_placements():
+        score = evaluate(grid, letter_index, angle, row, column)
+        if best is None or score > best[0]:
+            best = (score, actions)
+    return best[1]
@@ -0,0 +1,547 @@
+import math
+import random
+from collections import OrderedDict, deque
+
+from shapes import FlyingLetter
+
+COLUMNS = 10
+ROWS = 20
+
+TICK_RATE = 60  # simulation ticks per game second
+MOVE_TIME = 1  # in game seconds
+DIFFICULTY = 0.85
+LEVEL_SCORE = 1500
+PLACEMENT_CACHE_SIZE = 65536
+ZOBRIST_SEED = 0x7e7215  # fixed, so hashes are the same in every process
+
+
+# (columns, rows) -> zobrist table, every grid of one size shares its table
+zobrist_tables = {}
+
+
+def make_zobrist_table(columns, rows):
+    # one random 64-bit key for every cell
+    generator = random.Random(ZOBRIST_SEED)
+    return [[generator.getrandbits(64) for j in range(columns)] for i in range(rows)]
+
+
+def get_zobrist_table(columns, rows):
+    table = zobrist_tables.get((columns, rows))
+    if table is None:
+        table = zobrist_tables[columns, rows] = make_zobrist_table(columns, rows)
+    return table
+
+
+def get_spawn_position(columns):
+    # center block of a new letter (row, column)
+    return 1, columns // 2
+
+
+def get_min_size():
+    # smallest (columns, rows) of a playable board: every letter frame fits
+    # and every letter starts inside the board
+    frames = [offsets for angles in FlyingLetter.cells for offsets in angles]
+    columns = max(max(j for i, j in offsets) - min(j for i, j in offsets) + 1 for offsets in frames)
+    rows = max(max(i for i, j in offsets) - min(i for i, j in offsets) + 1 for offsets in frames)
+    spawn_frames = [angles[0] for angles in FlyingLetter.cells]
+
+    def fits(columns):
+        row, column = get_spawn_position(columns)
+        return all(0 <= column + j < columns and 0 <= row + i for offsets in spawn_frames for i, j in offsets)
+
+    while not fits(columns):
+        columns += 1
+    return columns, rows
+
+
+MIN_COLUMNS, MIN_ROWS = get_min_size()
+
+
+def seconds_to_ticks(seconds):
+    # whole ticks needed for the given time to pass, at least one
+    return max(1, math.ceil(round(seconds * TICK_RATE, 9)))
+
+
+class SimulationClock:
+    # turns wall clock milliseconds into a whole number of simulation ticks,
+    # so the game runs the same at any frame rate
+    def __init__(self, tick_rate=TICK_RATE, max_ticks_per_frame=8, max_backlog=30):
+        self.tick_rate = tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        # ticks behind after a stall are caught up over the next frames,
+        # anything beyond max_backlog is dropped
+        self.max_backlog = max_backlog
+        self.backlog = 0
+        # time that didn't make a whole tick yet, in 1 / 1000 of a tick
+        self.remainder = 0
+
+    def advance(self, milliseconds):
+        # returns the number of ticks to simulate this frame
+        self.remainder += milliseconds * self.tick_rate
+        self.backlog = min(self.backlog + self.remainder // 1000, self.max_backlog)
+        self.remainder %= 1000
+        ticks = min(self.backlog, self.max_ticks_per_frame)
+        self.backlog -= ticks
+        return ticks
+
+    def get_alpha(self):
+        # progress towards the next tick in 0..1, for interpolation while drawing
+        return self.remainder / 1000.0
+
+
+class Randomizer:
+    # 7-bag randomizer with its own random generator, the same seed gives the same numbers
+    def __init__(self, items_num, seed=None):
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.current_item = 0
+        self.items = [i for i in range(items_num)]
+        self.random.shuffle(self.items)
+
+    def get_number(self):
+        if self.current_item == len(self.items):
+            self.current_item = 0
+            self.shuffle()
+
+        item = self.items[self.current_item]
+        self.current_item += 1
+        return item
+
+    def generate(self, count):
+        # the next count numbers at once
+        numbers = []
+        while len(numbers) < count:
+            if self.current_item == len(self.items):
+                self.current_item = 0
+                self.shuffle()
+            end = min(len(self.items), self.current_item + count - len(numbers))
+            numbers.extend(self.items[self.current_item:end])
+            self.current_item = end
+        return numbers
+
+    def shuffle(self):
+        self.random.shuffle(self.items)
+
+    def reset(self):
+        self.current_item = 0
+        self.shuffle()
+
+    def get_state(self):
+        # json serializable state, see set_state
+        version, internal_state, gauss_next = self.random.getstate()
+        return {'items': list(self.items), 'current_item': self.current_item,
+                'random': [version, list(internal_state), gauss_next]}
+
+    def set_state(self, state):
+        self.items = list(state['items'])
+        self.current_item = state['current_item']
+        version, internal_state, gauss_next = state['random']
+        self.random.setstate((version, tuple(internal_state), gauss_next))
+
+
+class Grid:
+    # all game logic works with (row, column) grid indexes,
+    # pixel coordinates are only computed when the grid is drawn
+    def __init__(self, columns, rows):
+        if columns < MIN_COLUMNS or rows < MIN_ROWS:
+            raise ValueError('The board must have at least {0} columns and {1} rows'.format(MIN_COLUMNS, MIN_ROWS))
+        self.score = 0
+        self.lines = 0
+        self.game_over = False
+        # indexes of the rows deleted by the last update, in deletion order
+        self.cleared_rows = []
+
+        self.columns = columns
+        self.rows = rows
+
+        self.spawn_position = get_spawn_position(columns)
+
+        # rows x columns grid of color indexes (empty -> -1), used for drawing
+        self.grid = [[-1 for i in range(self.columns)] for j in range(self.rows)]
+        # bitboard: one int per row, bit j is set if the cell in column j is taken
+        self.row_bits = [0] * self.rows
+        self.full_row_bits = (1 << self.columns) - 1
+        self.empty_row = (-1,) * self.columns
+        # row index of the highest taken cell of each column (rows if the column is empty)
+        self.column_tops = [self.rows] * self.columns
+        # zobrist hash of the taken cells: xor of the keys of all taken cells,
+        # kept per row as well so rows can be moved on line clears
+        self.zobrist_table = get_zobrist_table(self.columns, self.rows)
+        self.row_hashes = [0] * self.rows
+        self.hash = 0
+
+    def collided(self, cells):
+        row_bits = self.row_bits
+        for row_index, column_index in cells:
+            if row_index >= self.rows or row_bits[row_index] >> column_index & 1:
+                return True
+        return False
+
+    def is_out_of_bounds(self, cells):
+        for row_index, column_index in cells:
+            if column_index >= self.columns or column_index < 0:
+                return True
+        return False
+
+    def is_game_over(self):
+        return self.game_over
+
+    def set_row(self, row_index, colors):
+        # replace a whole row, colors is a list of color indexes (empty -> -1)
+        bits = 0
+        for column_index, color_index in enumerate(colors):
+            if color_index >= 0:
+                bits |= 1 << column_index
+        self.grid[row_index][:] = colors
+        self.row_bits[row_index] = bits
+        row_hash = self.get_row_hash(row_index, bits)
+        self.hash ^= self.row_hashes[row_index] ^ row_hash
+        self.row_hashes[row_index] = row_hash
+        # only the columns whose top is at or below the row can change
+        column_tops = self.column_tops
+        for column_index in range(self.columns):
+            top = column_tops[column_index]
+            if bits >> column_index & 1:
+                if row_index < top:
+                    column_tops[column_index] = row_index
+            elif top == row_index:
+                column_tops[column_index] = self.find_column_top(column_index, row_index + 1)
+
+    def get_row_hash(self, row_index, bits):
+        # xor of the keys of the taken cells of a row at row_index
+        keys = self.zobrist_table[row_index]
+        row_hash = 0
+        while bits:
+            lowest_bit = bits & -bits
+            row_hash ^= keys[lowest_bit.bit_length() - 1]
+            bits ^= lowest_bit
+        return row_hash
+
+    def get_hash(self):
+        # 64-bit hash of the taken cells, use it to compare boards
+        return self.hash
+
+    def find_column_top(self, column_index, first_row):
+        # highest taken cell of the column starting from first_row
+        row_bits = self.row_bits
+        for row_index in range(max(first_row, 0), self.rows):
+            if row_bits[row_index] >> column_index & 1:
+                return row_index
+        return self.rows
+
+    def get_column_heights(self):
+        return [self.rows - top for top in self.column_tops]
+
+    def get_landing_row(self, row, column, bottoms):
+        # row the center block of a letter at (row, column) stops at when dropped,
+        # bottoms is the (column offset, lowest row offset) list of the letter
+        column_tops = self.column_tops
+        landing_row = self.rows
+        for j, i in bottoms:
+            top = column_tops[column + j]
+            if top <= row + i:
+                # the letter is under an overhang, the height map doesn't help here
+                return self.find_landing_row(row, column, bottoms)
+            landing_row = min(landing_row, top - 1 - i)
+        return landing_row
+
+    def find_landing_row(self, row, column, bottoms):
+        row_bits = self.row_bits
+        while True:
+            for j, i in bottoms:
+                below = row + i + 1
+                if below >= self.rows or row_bits[below] >> (column + j) & 1:
+                    return row
+            row += 1
+
+    def update(self, cells, color_index):
+        row_bits = self.row_bits
+        column_tops = self.column_tops
+        row_hashes = self.row_hashes
+        for row_index, column_index in cells:
+            if row_index >= 0 and column_index >= 0:
+                self.grid[row_index][column_index] = color_index
+                if not row_bits[row_index] >> column_index & 1:
+                    key = self.zobrist_table[row_index][column_index]
+                    row_hashes[row_index] ^= key
+                    self.hash ^= key
+                row_bits[row_index] |= 1 << column_index
+                if row_index < column_tops[column_index]:
+                    column_tops[column_index] = row_index
+
+        score = 0
+        self.cleared_rows = []
+        # search for full rows
+        for row_index, column_index in cells:
+            if row_index == 0:  # there is a block at the first row
+                self.game_over = True
+
+            # delete the row if it is full
+            if row_bits[row_index] == self.full_row_bits:
+                score += 1
+                # a negative index removes a row from the bottom, same as del does
+                cleared_row = row_index % self.rows
+                self.cleared_rows.append(cleared_row)
+                # the cleared row leaves the hash, the taken rows above it get the keys of the row below
+                self.hash ^= row_hashes[cleared_row]
+                for moved_row in range(cleared_row - 1, min(column_tops) - 1, -1):
+                    if row_bits[moved_row]:
+                        row_hash = self.get_row_hash(moved_row + 1, row_bits[moved_row])
+                        self.hash ^= row_hashes[moved_row] ^ row_hash
+                        row_hashes[moved_row] = row_hash
+                del row_hashes[cleared_row]
+                row_hashes.insert(0, 0)
+                # move the cleared row to the beginning of the grid and reuse it
+                del row_bits[row_index]
+                row_bits.insert(0, 0)
+                row = self.grid.pop(row_index)
+                row[:] = self.empty_row
+                self.grid.insert(0, row)
+                # rows above the cleared one moved down, a column topped by it has to be searched
+                for column_index in range(self.columns):
+                    top = column_tops[column_index]
+                    if top < cleared_row:
+                        column_tops[column_index] = top + 1
+                    elif top == cleared_row:
+                        column_tops[column_index] = self.find_column_top(column_index, cleared_row + 1)
+        self.lines += score
+        if score == 1:
+            self.score += 100
+        elif score == 2:
+            self.score += 300
+        elif score == 3:
+            self.score += 700
+        elif score == 4:
+            self.score += 1500
+        else:
+            self.score += score * 4 * 150
+
+    def add_garbage(self, rows_num, hole_column, color_index):
+        # pushes every row up and fills rows_num rows at the bottom with blocks of color_index,
+        # leaving the cell at hole_column empty; blocks pushed out at the top end the game
+        rows_num = min(rows_num, self.rows)
+        if any(self.row_bits[:rows_num]):
+            self.game_over = True
+        stack_top = min(self.column_tops)
+        garbage_bits = self.full_row_bits & ~(1 << hole_column)
+        for k in range(rows_num):
+            # the top row leaves the grid and is reused as a garbage row
+            row = self.grid.pop(0)
+            row[:] = [color_index] * self.columns
+            row[hole_column] = -1
+            self.grid.append(row)
+            del self.row_bits[0]
+            self.row_bits.append(garbage_bits)
+            del self.row_hashes[0]
+            self.row_hashes.append(0)
+
+        # every taken row moved, so it gets the keys of its new place
+        self.hash = 0
+        for row_index in range(max(stack_top - rows_num, 0), self.rows):
+            row_hash = self.get_row_hash(row_index, self.row_bits[row_index])
+            self.row_hashes[row_index] = row_hash
+            self.hash ^= row_hash
+
+        column_tops = self.column_tops
+        for column_index in range(self.columns):
+            top = column_tops[column_index] - rows_num
+            if column_index == hole_column and top == self.rows - rows_num:
+                # an empty column stays empty
+                top = self.rows
+            elif top < 0:
+                top = self.find_column_top(column_index, 0)
+            column_tops[column_index] = top
+
+    def get_score(self):
+        return self.score
+
+    def get_spawn_position(self):
+        return self.spawn_position
+
+
+# (board, letter index, angle, row, column) -> placements, least recently used first
+placement_cache = OrderedDict()
+
+
+def find_placements(grid, letter_index, angle, row, column):
+    # every final position a letter can reach by moving and rotating on its row and dropping,
+    # list of (angle, column, landing row, actions), positions with the same cells are listed once
+    letter_cells = FlyingLetter.cells[letter_index]
+
+    def fits(angle, column):
+        cells = [(row + i, column + j) for i, j in letter_cells[angle]]
+        return not (grid.is_out_of_bounds(cells) or grid.collided(cells))
+
+    # a new letter that overlaps the blocks can't fall, but it can still move out
+    start = (angle, column)
+    start_fits = fits(angle, column)
+
+    # breadth first search, so every position is reached with the fewest actions
+    paths = {start: ()}
+    queue = deque(paths)
+    while queue:
+        angle, column = queue.popleft()
+        actions = paths[(angle, column)]
+        for action, next_angle, next_column in ((Game.MOVE_LEFT, angle, column - 1),
+                                                (Game.MOVE_RIGHT, angle, column + 1),
+                                                (Game.ROTATE_CW, (angle + 1) % 4, column),
+                                                (Game.ROTATE_CCW, (angle - 1) % 4, column)):
+            position = (next_angle, next_column)
+            if position not in paths and fits(next_angle, next_column):
+                paths[position] = actions + (action,)
+                queue.append(position)
+
+    placements = []
+    found = set()
+    for (angle, column), actions in paths.items():
+        if (angle, column) == start and not start_fits:
+            landing_row = row
+        else:
+            landing_row = grid.get_landing_row(row, column, FlyingLetter.bottoms[letter_index][angle])
+        # symmetric letters (O, I, S, Z) have angles with the same cells
+        key = (letter_cells[angle], column, landing_row)
+        if key not in found:
+            found.add(key)
+            placements.append((angle, column, landing_row, actions + (Game.HARD_DROP,)))
+    return placements
+
+
+def get_placements(grid, letter_index, angle, row, column):
+    # find_placements with a cache, the same boards keep coming back during a search;
+    # empty boards of all sizes have the same hash, so the size is part of the key
+    key = (grid.columns, grid.rows, grid.get_hash(), letter_index, angle, row, column)
+    placements = placement_cache.get(key)
+    if placements is not None:
+        placement_cache.move_to_end(key)
+        return placements
+    placements = find_placements(grid, letter_index, angle, row, column)
+    placement_cache[key] = placements
+    if len(placement_cache) > PLACEMENT_CACHE_SIZE:
+        placement_cache.popitem(last=False)
+    return placements
+
+
+class Game:
+    # input actions
+    MOVE_LEFT, MOVE_RIGHT, ROTATE_CW, ROTATE_CCW, SPEED_UP, RESET_SPEED, HARD_DROP = range(7)
+
+    def __init__(self, grid=None, randomizer=None, seed=None):
+        if grid is None:
+            grid = Grid(COLUMNS, ROWS)
+        if randomizer is None:
+            randomizer = Randomizer(len(FlyingLetter.letters), seed)
+        self.grid = grid
+        self.randomizer = randomizer
+
+        self.level = 1
+        self.letter_move_ticks = self.get_move_ticks()
+        self.ticks = 0
+        # number of letters taken from the randomizer
+        self.letters_count = 0
+        # the letter was hard dropped and is placed on the next tick
+        self.dropping = False
+        self.current_letter = self.new_letter()
+        self.next_letter = self.new_letter()
+
+    def new_letter(self):
+        self.letters_count += 1
+        return FlyingLetter(self.grid.get_spawn_position(), self.letter_move_ticks, self.randomizer)
+
+    def get_move_ticks(self):
+        # ticks between two moves down at the current level
+        return seconds_to_ticks(MOVE_TIME * DIFFICULTY ** (self.level - 1))
+
+    def act(self, action):
+        # returns False if the move was blocked and undone
+        letter = self.current_letter
+        if action == Game.MOVE_LEFT:
+            letter.move_left()
+            undo = letter.move_right
+        elif action == Game.MOVE_RIGHT:
+            letter.move_right()
+            undo = letter.move_left
+        elif action == Game.ROTATE_CW:
+            letter.rotate_cw()
+            undo = letter.rotate_ccw
+        elif action == Game.ROTATE_CCW:
+            letter.rotate_ccw()
+            undo = letter.rotate_cw
+        elif action == Game.SPEED_UP:
+            letter.speed_up()
+            return True
+        elif action == Game.RESET_SPEED:
+            letter.reset_speed()
+            return True
+        elif action == Game.HARD_DROP:
+            letter.set_position((self.get_landing_row(), letter.column))
+            self.dropping = True
+            return True
+        else:
+            raise ValueError('Unknown action: ' + str(action))
+
+        cells = letter.get_cells()
+        if self.grid.is_out_of_bounds(cells) or self.grid.collided(cells):
+            undo()
+            return False
+        return True
+
+    def tick(self):
+        # advance the simulation by one step, returns True if the letter was placed
+        self.ticks += 1
+        letter = self.current_letter
+        if self.dropping:
+            # the letter may have been moved or rotated after the drop, it lands again from there
+            letter.set_position((self.get_landing_row(), letter.column))
+            self.dropping = False
+        else:
+            letter.move_down()
+            if not self.grid.collided(letter.get_cells()):
+                return False
+            letter.move_up()
+
+        self.grid.update(letter.get_cells(), letter.get_color_index())
+        # increase difficulty level every time 1500 points are claimed
+        if self.grid.get_score() / LEVEL_SCORE >= self.level:
+            self.level += 1
+            self.letter_move_ticks = self.get_move_ticks()
+
+        self.current_letter = self.next_letter
+        self.current_letter.set_position(self.grid.get_spawn_position())
+        self.current_letter.set_speed(self.letter_move_ticks)
+        self.next_letter = self.new_letter()
+        return True
+
+    def get_landing_row(self):
+        letter = self.current_letter
+        if self.grid.collided(letter.get_cells()):
+            # a new letter that overlaps the blocks can't fall
+            return letter.row
+        return self.grid.get_landing_row(letter.row, letter.column, letter.get_bottoms())
+
+    def get_placements(self):
+        letter = self.current_letter
+        return get_placements(self.grid, letter.random_index, letter.current_angle, letter.row, letter.column)
+
+    def get_ghost_cells(self):
+        # cells the current letter would take after a hard drop
+        shift = self.get_landing_row() - self.current_letter.row
+        return [(row_index + shift, column_index) for row_index, column_index in self.current_letter.get_cells()]
+
+    def step(self, actions=()):
+        for action in actions:
+            self.act(action)
+        return self.tick()
+
+    def is_game_over(self):
+        return self.grid.is_game_over()
+
+    def get_score(self):
+        return self.grid.get_score()
+
+    def get_lines(self):
+        return self.grid.lines
+
+    def get_level(self):
+        return self.level
@@ -0,0 +1,101 @@
+import atexit
+import os
+import queue
+import struct
+import threading
+
+HIGHSCORES_FILE = 'highscores.dat'
+LEGACY_FILE = 'highscores.txt'  # one score per line, read once to migrate it
+TOP_SIZE = 10
+MAGIC = b'THS1'
+HEADER = struct.Struct('<4sH')  # magic, number of scores, then one uint32 per score
+
+
+class HighscoreStore:
+    # keeps the best scores in memory, the file is written by a background thread
+    def __init__(self, filename=HIGHSCORES_FILE, legacy_filename=LEGACY_FILE, size=TOP_SIZE):
+        self.filename = filename
+        self.legacy_filename = legacy_filename
+        self.size = size
+        self.scores = []  # best first
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def load(self):
+        if os.path.isfile(self.filename):
+            with open(self.filename, 'rb') as file:
+                data = file.read()
+            try:
+                magic, count = HEADER.unpack_from(data)
+                scores = struct.unpack_from('<{0}I'.format(count), data, HEADER.size)
+            except struct.error:
+                magic = None
+            if magic == MAGIC:
+                self.scores = sorted(scores, reverse=True)[:self.size]
+                return
+        if self.legacy_filename is not None and os.path.isfile(self.legacy_filename):
+            # first run after the text file: keep its best scores in the new file
+            with open(self.legacy_filename, 'r') as file:
+                scores = [int(line) for line in file if line.strip().isdigit()]
+            self.scores = sorted(scores, reverse=True)[:self.size]
+            self.save()
+
+    def get_highscore(self):
+        return self.scores[0] if self.scores else 0
+
+    def get_scores(self):
+        return list(self.scores)
+
+    def add(self, score):
+        # returns the place of the score in the table starting from 0, None if it didn't get in
+        if len(self.scores) >= self.size and score <= self.scores[-1]:
+            return None
+        place = 0
+        while place < len(self.scores) and self.scores[place] >= score:
+            place += 1
+        self.scores.insert(place, score)
+        del self.scores[self.size:]
+        self.save()
+        return place
+
+    def to_bytes(self):
+        return HEADER.pack(MAGIC, len(self.scores)) + struct.pack('<{0}I'.format(len(self.scores)), *self.scores)
+
+    def save(self):
+        # the data is taken now and written in the background
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.write_loop, daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+        self.queue.put(self.to_bytes())
+
+    def write_loop(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            # only the newest table matters
+            while not self.queue.empty():
+                newer = self.queue.get()
+                if newer is None:
+                    self.write(data)
+                    return
+                data = newer
+            self.write(data)
+
+    def write(self, data):
+        # the old file stays whole until the new one is complete
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.filename)
+
+    def close(self):
+        # waits until everything is written
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            atexit.unregister(self.close)
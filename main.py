@@ -1,93 +1,87 @@
+import argparse
 import os
-import random
+import time
+from collections import OrderedDict
 
 import pygame
 
-from shapes import *
+import engine
+from assets import assets
+from atlas import TileAtlas, build_atlases
+from audio import Audio
+from engine import TICK_RATE, Game, SimulationClock
+from highscores import HighscoreStore
+from profiler import Profiler
+from replay import Recorder
 
 FPS = 60
 TILESIZE = 32
+TILE_SIZES = (TILESIZE, 24, 16, 8)  # tile sizes prepared in the atlas
 resolution = WIDTH, HEIGHT = 634, 800
 GAME_WIDTH, GAME_HEIGHT = 320, 640
+GAME_AREA = (26, 130, GAME_WIDTH, GAME_HEIGHT)  # the board window of game_background.png
 columns = 10
 rows = 20
 
-START_MOVE_TIME = 60
-DIFFICULTY = 0.85
-
-
-def load_image(name, colorkey=None):
-    fullname = os.path.join('data', name)
-    try:
-        image = pygame.image.load(fullname)
-    except pygame.error as message:
-        print('Cannot load image:', name)
-        raise SystemExit(message)
-    image = image.convert_alpha()
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey)
-    return image
+TEXT_CACHE_SIZE = 256
+GHOST_COLOR = (255, 255, 255)
+GHOST_WIDTH = 2
+REPLAYS_DIR = 'replays'
+TRACES_DIR = 'traces'
+PROFILER_COORD = (8, HEIGHT - 158)
 
 
 class FlickeringSprite(pygame.sprite.Sprite):
-    def __init__(self, image, x, y, flickering_timeout=20):
+    # hidden for flickering_timeout frames, then shown for visible_time frames, and so on,
+    # the state depends only on the time so the sprite doesn't have to be updated every frame
+    def __init__(self, image, x, y, flickering_timeout=20, visible_time=10):
         self.sprite_group = pygame.sprite.Group()
         super().__init__(self.sprite_group)
         self.image = image
         self.rect = self.image.get_rect()
         self.flickering_timeout = flickering_timeout
-        self.time_to_timeout = 0
-        self.time = 0
-        self.timeout_time = 0
+        self.visible_time = visible_time
+        self.start_time = pygame.time.get_ticks()
         self.rect.x = x
         self.rect.y = y
 
-    def draw(self, screen):
-        if self.timeout_time > 0:
-            self.sprite_group.draw(screen)
-            self.timeout_time -= 1
+    def get_frame(self, time):
+        # frames of the blink cycle since the sprite became visible for the first time
+        return (time - self.start_time) * FPS // 1000 - self.flickering_timeout
+
+    def is_visible(self, time=None):
+        if time is None:
+            time = pygame.time.get_ticks()
+        frame = self.get_frame(time)
+        return frame >= 0 and frame % self.flickering_timeout < self.visible_time
+
+    def get_next_change(self, time=None):
+        # milliseconds until the sprite is shown or hidden
+        if time is None:
+            time = pygame.time.get_ticks()
+        frame = self.get_frame(time)
+        if frame < 0:
+            next_frame = 0
+        elif frame % self.flickering_timeout < self.visible_time:
+            next_frame = frame - frame % self.flickering_timeout + self.visible_time
         else:
-            if self.time == 0:
-                self.sprite_group.draw(screen)
-
-    def update(self):
-        self.time += (self.time + 1) % 2
-        self.time_to_timeout += 1
-
-        if self.time_to_timeout >= self.flickering_timeout:
-            self.timeout_time = 10
-            self.time_to_timeout = 0
-
+            next_frame = frame - frame % self.flickering_timeout + self.flickering_timeout
+        next_time = self.start_time + -(-(next_frame + self.flickering_timeout) * 1000 // FPS)
+        return max(next_time - time, 1)
 
-class Randomizer:
-    def __init__(self, items_num):
-        self.current_item = 0
-        self.items = [i for i in range(items_num)]
-        random.shuffle(self.items)
-
-    def get_number(self):
-        if self.current_item == len(self.items):
-            self.current_item = 0
-            self.shuffle()
-
-        item = self.items[self.current_item]
-        self.current_item += 1
-        return item
+    def draw(self, screen):
+        if self.is_visible():
+            self.sprite_group.draw(screen)
 
-    def shuffle(self):
-        random.shuffle(self.items)
 
-    def reset(self):
-        self.current_item = 0
-        self.shuffle()
+def get_tile_size(columns, rows, area=GAME_AREA):
+    # biggest square tile that fits the whole board into the game area
+    return max(1, min(area[2] // columns, area[3] // rows))
 
 
-class Grid:
-    def __init__(self, columns, rows, block_dimensions, screen_res):
-        self.score = 0
-        self.game_over = False
+class Grid(engine.Grid):
+    def __init__(self, columns, rows, block_dimensions, area=GAME_AREA):
+        super().__init__(columns, rows)
 
         self.block_width = block_dimensions[0]
         self.block_height = block_dimensions[1]
@@ -95,49 +89,107 @@ class Grid:
         self.area_width = columns * self.block_width
         self.area_height = rows * self.block_height
 
-        # top left corner of game area
-        self.min_coord = ((screen_res[0] // 2 - self.area_width + 29),
-                          (screen_res[1] - self.area_height) / 2 + 50)
+        # top left corner of game area, the board is centered in the area (x, y, width, height)
+        self.min_coord = (area[0] + (area[2] - self.area_width) // 2,
+                          area[1] + (area[3] - self.area_height) // 2)
         # bottom right corner of game area
         self.max_coord = (self.min_coord[0] + self.area_width,
                           self.min_coord[1] + self.area_height)
 
-        # center coord of game area (letter start coord)
-        self.center_coord = (self.min_coord[0] + (columns // 2) * self.block_width,
-                             self.min_coord[1] + self.block_height)
-
-        self.columns = columns
-        self.rows = rows
-        # rows x columns grid
-        self.grid = [[-1 for i in range(self.columns)] for j in range(self.rows)]
-
-        self.background = load_image('black_background.png')
-        self.background = pygame.transform.scale(self.background, (self.area_width, self.area_height))
+        self.background = assets.image('black_background.png', (self.area_width, self.area_height))
         self.background.set_alpha(200)
 
-    def collided(self, letter_coords):
-        indexes_list = self.convert_coords(letter_coords)
-        for row_index, column_index in indexes_list:
-            if row_index >= self.rows or self.grid[row_index][column_index] >= 0:
-                return True
-        return False
-
-    def is_out_of_bounds(self, letter_coords):
-        for x, y in letter_coords:
-            if x > self.max_coord[0] - self.block_width or x < self.min_coord[0]:
-                return True
-        return False
-
-    def is_game_over(self):
-        return self.game_over
-
-    def convert_coords(self, coords):
-        indexes_list = []
-        for coord in coords:
-            column_index = int((coord[0] - self.min_coord[0]) // self.block_width)
-            row_index = int((coord[1] - self.min_coord[1]) // self.block_height)
-            indexes_list.append((row_index, column_index))
-        return indexes_list
+        # cached picture of the game area with the placed blocks, see init_surface
+        self.surface = None
+        # screen rect of the game area that changed since the last get_dirty_rect call
+        self.dirty_rect = None
+
+    def init_surface(self, color_blocks, backdrop):
+        # backdrop is the screen background under the game area
+        self.color_blocks = color_blocks
+        self.rect = pygame.Rect(int(self.min_coord[0]), int(self.min_coord[1]), self.area_width, self.area_height)
+        self.base = backdrop.subsurface(self.rect).copy()
+        self.base.blit(self.background, (0, 0))
+        # placed blocks on a transparent layer, so rows can be scrolled on line clears
+        self.blocks_layer = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.surface = self.base.copy()
+        for i in range(self.rows):
+            self.draw_row(i)
+        self.compose_rows(0, self.rows - 1)
+
+    def draw_row(self, row_index):
+        row_rect = (0, row_index * self.block_height, self.area_width, self.block_height)
+        self.blocks_layer.fill((0, 0, 0, 0), row_rect)
+        for j, color_index in enumerate(self.grid[row_index]):
+            if color_index >= 0:
+                self.blocks_layer.blit(self.color_blocks[color_index],
+                                       (j * self.block_width, row_index * self.block_height))
+
+    def compose_rows(self, first_row, last_row):
+        # rebuild the cached surface from the base and the blocks layer
+        area = pygame.Rect(0, first_row * self.block_height,
+                           self.area_width, (last_row - first_row + 1) * self.block_height)
+        self.surface.blit(self.base, area, area)
+        self.surface.blit(self.blocks_layer, area, area)
+        self.add_dirty_rect(area.move(self.rect.topleft))
+
+    def add_dirty_rect(self, rect):
+        if self.dirty_rect is None:
+            self.dirty_rect = rect
+        else:
+            self.dirty_rect = self.dirty_rect.union(rect)
+
+    def get_dirty_rect(self):
+        rect = self.dirty_rect
+        self.dirty_rect = None
+        return rect
+
+    def set_row(self, row_index, colors):
+        super().set_row(row_index, colors)
+        if self.surface is not None:
+            self.draw_row(row_index)
+            self.compose_rows(row_index, row_index)
+
+    def update(self, cells, color_index):
+        # highest taken row after the letter is placed, the rows above it are empty and stay empty
+        stack_top = max(min(min(self.column_tops), min(row_index for row_index, column_index in cells)), 0)
+        super().update(cells, color_index)
+        if self.surface is None:
+            return
+        block = self.color_blocks[color_index]
+        for row_index, column_index in cells:
+            if row_index >= 0 and column_index >= 0:
+                self.blocks_layer.blit(block, (column_index * self.block_width, row_index * self.block_height))
+        # the cleared rows are deleted in order, the taken rows above each of them move one row down
+        first_row = stack_top
+        for row_index in self.cleared_rows:
+            if row_index > stack_top:
+                rows_above = self.blocks_layer.subsurface(0, stack_top * self.block_height, self.area_width,
+                                                          (row_index - stack_top + 1) * self.block_height)
+                rows_above.scroll(0, self.block_height)
+            self.blocks_layer.fill((0, 0, 0, 0), (0, stack_top * self.block_height,
+                                                  self.area_width, self.block_height))
+            stack_top += 1
+        rows_list = [row_index for row_index, column_index in cells] + self.cleared_rows
+        if not self.cleared_rows:
+            first_row = max(min(rows_list), 0)
+        self.compose_rows(first_row, max(rows_list))
+
+    def add_garbage(self, rows_num, hole_column, color_index):
+        stack_top = min(self.column_tops)
+        super().add_garbage(rows_num, hole_column, color_index)
+        if self.surface is None:
+            return
+        rows_num = min(rows_num, self.rows)
+        # the taken rows move up, rows pushed out at the top fall off the layer,
+        # then the garbage rows are drawn under them
+        first_row = max(stack_top - rows_num, 0)
+        moved_rows = self.blocks_layer.subsurface(0, first_row * self.block_height, self.area_width,
+                                                  (self.rows - first_row) * self.block_height)
+        moved_rows.scroll(0, -rows_num * self.block_height)
+        for row_index in range(self.rows - rows_num, self.rows):
+            self.draw_row(row_index)
+        self.compose_rows(first_row, self.rows - 1)
 
     def convert_indexes(self, indexes):
         coords_list = []
@@ -147,42 +199,15 @@ class Grid:
             coords_list.append((x, y))
         return coords_list
 
-    def update(self, coords, color_index):
-        indexes_list = self.convert_coords(coords)
-        for row_index, column_index in indexes_list:
-            if row_index >= 0 and column_index >= 0:
-                self.grid[row_index][column_index] = color_index
-
-        score = 0
-        # search for full rows
-        for row_index, column_index in indexes_list:
-            if row_index == 0:  # there is a block at the first row
-                self.game_over = True
-
-            full_row = True
-            for j in range(self.columns):
-                if self.grid[row_index][j] == -1:  # cell is empty
-                    full_row = False
-                    break
-
-            # delete the row if it is full
-            if full_row:
-                del self.grid[row_index]
-                score += 1
-                # insert a new line at the beginning of the grid
-                self.grid.insert(0, [-1 for i in range(self.columns)])
-        if score == 1:
-            self.score += 100
-        elif score == 2:
-            self.score += 300
-        elif score == 3:
-            self.score += 700
-        elif score == 4:
-            self.score += 1500
-        else:
-            self.score += score * 4 * 150
+    def show_letter(self, screen, atlas, letter):
+        # the whole letter is one picture of the atlas
+        atlas.show_letter(screen, letter.get_color_index(), letter.current_angle,
+                          self.convert_indexes([letter.get_position()])[0])
 
     def show(self, screen, color_blocks):
+        if self.surface is not None:
+            screen.blit(self.surface, self.rect)
+            return
         screen.blit(self.background, self.min_coord)
         for i in range(self.rows):
             for j in range(self.columns):
@@ -193,166 +218,303 @@ class Grid:
                     coord_y = self.min_coord[1] + i * self.block_height
                     screen.blit(color_blocks[color_index], (coord_x, coord_y))
 
+    def get_message_coord(self, text_surface):
+        text_x = self.min_coord[0] + (self.area_width - text_surface.get_width()) // 2
+        text_y = (self.min_coord[1] + self.area_height) // 2
+        return text_x, text_y
+
     def display_message(self, screen, font, color, message):
-        text_surface = font.render(str(message), True, color).convert_alpha()
-        text_x = self.min_coord[0] + (self.area_width - text_surface.get_width()) / 2
-        text_y = (self.min_coord[1] + self.area_height) / 2
-        screen.blit(text_surface, (text_x, text_y))
+        text_surface = write(font, message, color)
+        screen.blit(text_surface, self.get_message_coord(text_surface))
 
-    def get_score(self):
-        return self.score
 
-    def get_center_coord(self):
-        return self.center_coord
+# (font, message, color) -> rendered text, least recently used first
+text_cache = OrderedDict()
 
 
 def write(font, message, color):
+    key = (font, str(message), tuple(color))
+    text = text_cache.get(key)
+    if text is not None:
+        text_cache.move_to_end(key)
+        return text
+
     text = font.render(str(message), True, color)
     text = text.convert_alpha()
 
+    text_cache[key] = text
+    if len(text_cache) > TEXT_CACHE_SIZE:
+        text_cache.popitem(last=False)
     return text
 
 
-def main_menu(screen):
-    clock = pygame.time.Clock()
-    background = load_image('background.png')
-    logo = load_image('logo.png')
+def get_blocks_rect(coords, block_dimensions):
+    # bounding rect of the blocks at the given pixel coords
+    rect = pygame.Rect(coords[0], block_dimensions)
+    for coord in coords[1:]:
+        rect.union_ip(pygame.Rect(coord, block_dimensions))
+    return rect
+
+
+class Renderer:
+    # redraws only the parts of the game screen that changed since the last frame
+    # and pushes them to the display with a single pygame.display.update(rects)
+    def __init__(self, screen, background, grid, atlas, font, next_letter_coord, profiler=None, preview_atlas=None):
+        self.screen = screen
+        self.grid = grid
+        self.atlas = atlas
+        # the next letter keeps the normal tile size on boards with small tiles
+        self.preview_atlas = atlas if preview_atlas is None else preview_atlas
+        self.font = font
+        self.next_letter_coord = next_letter_coord
+        self.profiler = profiler
+        self.block_dimensions = (grid.block_width, grid.block_height)
+        self.ghost_width = min(GHOST_WIDTH, max(grid.block_width // 4, 1))
+
+        # parts of the frame that never change, the game area is drawn from the grid surface
+        self.static = background
+        grid.init_surface(atlas, background)
+        # name -> (state, rect) of the letters on the screen
+        self.letters = {}
+        # name -> [key, surface, rect] of the texts and other surfaces drawn on top
+        self.texts = {}
+        self.dirty = []
+        self.invalidate()
+
+    def invalidate(self):
+        self.dirty = [self.screen.get_rect()]
+
+    def set_text(self, name, message, coord):
+        text = self.texts.get(name)
+        if text is None or text[0] != message:
+            self.set_surface(name, write(self.font, message, (255, 255, 255)), coord, message)
+
+    def set_surface(self, name, surface, coord, key=None):
+        # key tells whether the surface changed, the surface itself by default
+        if key is None:
+            key = surface
+        text = self.texts.get(name)
+        if text is not None:
+            if text[0] == key:
+                return
+            self.dirty.append(text[2])
+        rect = surface.get_rect(topleft=coord)
+        self.dirty.append(rect)
+        self.texts[name] = [key, surface, rect]
+
+    def remove_surface(self, name):
+        text = self.texts.pop(name, None)
+        if text is not None:
+            self.dirty.append(text[2])
+
+    def set_letter(self, name, state, rect):
+        # state identifies what is drawn in rect, both are None if nothing is drawn
+        letter = self.letters.get(name)
+        if letter is not None:
+            if letter[0] == state:
+                return
+            self.dirty.append(letter[1])
+        if rect is not None:
+            self.dirty.append(rect)
+        self.letters[name] = (state, rect)
+
+    def draw(self, letter, next_letter, ghost_cells=None):
+        grid = self.grid
+        if letter is not None:
+            rect = get_blocks_rect(grid.convert_indexes(letter.get_cells()), self.block_dimensions)
+            self.set_letter('current', letter.get_state(), rect)
+        else:
+            self.set_letter('current', None, None)
+        ghost_coords = None
+        if ghost_cells:
+            ghost_coords = grid.convert_indexes(ghost_cells)
+            self.set_letter('ghost', tuple(ghost_cells), get_blocks_rect(ghost_coords, self.block_dimensions))
+        else:
+            self.set_letter('ghost', None, None)
+        coord = self.next_letter_coord
+        size = self.preview_atlas.size
+        rect = get_blocks_rect([(coord[0] + j * size, coord[1] + i * size)
+                                for i, j in next_letter.get_offsets()], (size, size))
+        self.set_letter('next', next_letter.get_state(), rect)
+        rect = grid.get_dirty_rect()
+        if rect is not None:
+            self.dirty.append(rect)
+
+        rects = self.dirty
+        if not rects:
+            return
+        screen = self.screen
+        for rect in rects:
+            screen.set_clip(rect)
+            screen.blit(self.static, rect, rect)
+            area = rect.clip(grid.rect)
+            if area:
+                screen.blit(grid.surface, area, area.move(-grid.rect.x, -grid.rect.y))
+            if ghost_coords is not None and rect.colliderect(self.letters['ghost'][1]):
+                for coord in ghost_coords:
+                    pygame.draw.rect(screen, GHOST_COLOR, (coord, self.block_dimensions), self.ghost_width)
+            if letter is not None and rect.colliderect(self.letters['current'][1]):
+                grid.show_letter(screen, self.atlas, letter)
+            if rect.colliderect(self.letters['next'][1]):
+                self.preview_atlas.show_letter(screen, next_letter.get_color_index(), next_letter.current_angle,
+                                               self.next_letter_coord)
+            for message, surface, text_rect in self.texts.values():
+                if rect.colliderect(text_rect):
+                    screen.blit(surface, text_rect)
+        screen.set_clip(None)
+        if self.profiler is not None:
+            self.profiler.mark('draw')
+        pygame.display.update(rects)
+        if self.profiler is not None:
+            self.profiler.mark('display')
+        self.dirty = []
+
+
+def main_menu(screen, audio):
+    background = assets.image('background.png')
+    logo = assets.image('logo.png')
     text = ['START GAME', 'EXIT']
     text_coord_y = HEIGHT // 2 - HEIGHT // 8
     text_coord_x = WIDTH // 2
-    font = pygame.font.Font('font/PressStart2P.ttf', 30)
+    font = assets.font('PressStart2P.ttf', 30)
     for line in text:
-        string_rendered = font.render(line, 1, pygame.Color('white'))
+        string_rendered = write(font, line, pygame.Color('white'))
         intro_rect = string_rendered.get_rect()
         text_coord_y += intro_rect.height + 20
         text_height = intro_rect.height + 20
         intro_rect.top = text_coord_y
         intro_rect.x = text_coord_x - intro_rect.width // 2
         screen.blit(string_rendered, intro_rect)
-    left_arrow = FlickeringSprite(load_image('flickering_arrow_l.png'), WIDTH // 2 - 185,
+    left_arrow = FlickeringSprite(assets.image('flickering_arrow_l.png'), WIDTH // 2 - 185,
                                   HEIGHT // 2 - HEIGHT // 8 + 47)
-    right_arrow = FlickeringSprite(load_image('flickering_arrow_r.png'), WIDTH // 2 + 150,
+    right_arrow = FlickeringSprite(assets.image('flickering_arrow_r.png'), WIDTH // 2 + 150,
                                    HEIGHT // 2 - HEIGHT // 8 + 47)
     active_button = 'start'
+    # the menu is drawn only when the selection, the arrows or the window change,
+    # in between it sleeps in pygame.event.wait
+    drawn_state = None
     while True:
-        screen.blit(background, (0, 0))
-        screen.blit(logo, (5, 95))
-        for event in pygame.event.get():
+        state = (active_button, left_arrow.is_visible())
+        if state != drawn_state:
+            drawn_state = state
+            screen.blit(background, (0, 0))
+            screen.blit(logo, (5, 95))
+            if active_button == 'start':
+                left_arrow.rect.x, left_arrow.rect.y = WIDTH // 2 - 185, HEIGHT // 2 - HEIGHT // 8 + 47
+                right_arrow.rect.x, right_arrow.rect.y = WIDTH // 2 + 150, HEIGHT // 2 - HEIGHT // 8 + 47
+            elif active_button == 'exit':
+                left_arrow.rect.x, left_arrow.rect.y = WIDTH // 2 - 95, HEIGHT // 2 - HEIGHT // 8 + 100
+                right_arrow.rect.x, right_arrow.rect.y = WIDTH // 2 + 55, HEIGHT // 2 - HEIGHT // 8 + 100
+            text_coord_y = HEIGHT // 2 - HEIGHT // 8
+            pygame.draw.rect(screen, (0, 0, 0), (WIDTH // 2 - 190, HEIGHT // 2 - HEIGHT // 8 + 10, 373, 150))
+            for line in text:
+                string_rendered = write(font, line, pygame.Color('white'))
+                intro_rect = string_rendered.get_rect()
+                text_coord_y += intro_rect.height + 20
+                intro_rect.top = text_coord_y
+                intro_rect.x = text_coord_x - intro_rect.width // 2
+                screen.blit(string_rendered, intro_rect)
+            left_arrow.draw(screen)
+            right_arrow.draw(screen)
+            pygame.display.flip()
+
+        events = [pygame.event.wait(left_arrow.get_next_change())] + pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 exit()
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                drawn_state = None
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN:
-                    sound['menu_chose'].play()
+                    audio.play('menu_chose')
+                    audio.flush()
                     if active_button == 'start':
                         return
                     elif active_button == 'exit':
                         exit()
                 elif event.key == pygame.K_DOWN:
-                    sound['menu_move'].play()
+                    audio.play('menu_move')
                     if active_button == 'start':
                         active_button = 'exit'
                     else:
                         active_button = 'start'
                 elif event.key == pygame.K_UP:
-                    sound['menu_move'].play()
+                    audio.play('menu_move')
                     if active_button == 'start':
                         active_button = 'exit'
                     else:
                         active_button = 'start'
-
-        if active_button == 'start':
-            left_arrow.rect.x, left_arrow.rect.y = WIDTH // 2 - 185, HEIGHT // 2 - HEIGHT // 8 + 47
-            right_arrow.rect.x, right_arrow.rect.y = WIDTH // 2 + 150, HEIGHT // 2 - HEIGHT // 8 + 47
-        elif active_button == 'exit':
-            left_arrow.rect.x, left_arrow.rect.y = WIDTH // 2 - 95, HEIGHT // 2 - HEIGHT // 8 + 100
-            right_arrow.rect.x, right_arrow.rect.y = WIDTH // 2 + 55, HEIGHT // 2 - HEIGHT // 8 + 100
-        text_coord_y = HEIGHT // 2 - HEIGHT // 8
-        pygame.draw.rect(screen, (0, 0, 0), (WIDTH // 2 - 190, HEIGHT // 2 - HEIGHT // 8 + 10, 373, 150))
-        for line in text:
-            string_rendered = font.render(line, 1, pygame.Color('white'))
-            intro_rect = string_rendered.get_rect()
-            text_coord_y += intro_rect.height + 20
-            intro_rect.top = text_coord_y
-            intro_rect.x = text_coord_x - intro_rect.width // 2
-            screen.blit(string_rendered, intro_rect)
-        left_arrow.update()
-        right_arrow.update()
-        left_arrow.draw(screen)
-        right_arrow.draw(screen)
-        pygame.display.flip()
-        clock.tick(FPS)
-
-
-if __name__ == '__main__':
+        audio.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play Tetris')
+    parser.add_argument('--columns', type=int, default=columns, help='board width in cells')
+    parser.add_argument('--rows', type=int, default=rows, help='board height in cells')
+    args = parser.parse_args(argv)
+    # every cell needs at least one pixel of the game area
+    if not engine.MIN_COLUMNS <= args.columns <= GAME_AREA[2]:
+        parser.error('--columns must be from {0} to {1}'.format(engine.MIN_COLUMNS, GAME_AREA[2]))
+    if not engine.MIN_ROWS <= args.rows <= GAME_AREA[3]:
+        parser.error('--rows must be from {0} to {1}'.format(engine.MIN_ROWS, GAME_AREA[3]))
+    # custom boards get smaller tiles so that they fit into the game area
+    tile_size = get_tile_size(args.columns, args.rows)
+    custom_board = (args.columns, args.rows) != (columns, rows)
+
+    # only the display, the fonts and the mixer are used
     pygame.mixer.pre_init(44100, -16, 1, 512)
-    pygame.init()
+    pygame.display.init()
+    pygame.font.init()
+    pygame.mixer.init()
+    # decode the assets while the window comes up
+    assets.preload(background=True)
     screen = pygame.display.set_mode(resolution)
     pygame.display.set_caption('Tetris')
     clock = pygame.time.Clock()
     pygame.key.set_repeat(100, 70)
+    assets.wait()
+
+    font = assets.font('PressStart2P.ttf', 34)
+    game_background = assets.image('game_background.png')
 
-    font = pygame.font.Font(os.path.join('font', 'PressStart2P.ttf'), 34)
-    background = load_image('background.png')
-    game_background = load_image('game_background.png')
-
-    randomizer = Randomizer(7)
-    get_number = randomizer.get_number
-    reset = randomizer.reset
-
-    blocks = [load_image('tile1.png'), load_image('tile2.png'), load_image('tile3.png'), load_image('tile1.png'),
-              load_image('tile2.png'), load_image('tile3.png'), load_image('tile1.png')]
-    sound = {'menu_move': pygame.mixer.Sound('data/menu_move.ogg'),
-             'menu_chose': pygame.mixer.Sound('data/menu_chose.ogg'),
-             'game_end': pygame.mixer.Sound('data/game_end.ogg'),
-             'new_highscore': pygame.mixer.Sound('data/new_highscore.ogg'),
-             'pause': pygame.mixer.Sound('data/pause.ogg'),
-             'letter_place': pygame.mixer.Sound('data/letter_place.ogg'),
-             'rotate': pygame.mixer.Sound('data/rotate.ogg'),
-             'letter_move': pygame.mixer.Sound('data/letter_move.ogg')
-             }
+    atlases = build_atlases(assets, TILE_SIZES)
+    if tile_size not in atlases:
+        atlases[tile_size] = TileAtlas(assets, tile_size)
+    atlas = atlases[tile_size]
+    audio = Audio(assets)
     next_letter_coord = (442, 430)
-    next_coord = (next_letter_coord[0] - 10, next_letter_coord[1] - 3 * TILESIZE)
     top_left = (380, 156)
     score_coord = (413, 200)
     time_coord = (18, 33)
     level_coord = (446, 615)
     highscore_coord = (416, 109)
+    # F3 or TETRIS_PROFILE=1 turn on the frame profiler
+    profiler = Profiler(os.environ.get('TETRIS_PROFILE') == '1')
+    profiler_font = assets.font('PressStart2P.ttf', 8)
+
+    highscores = HighscoreStore()
+    highscores.load()
 
     menu_running = True
     while menu_running:
-        randomizer.reset()
-        pygame.mixer.music.load('data/korobeiniki.ogg')
-        pygame.mixer.music.set_volume(0.5)
-        pygame.mixer.music.play(-1)
-        main_menu(screen)
-
-        if os.path.isfile('highscores.txt'):
-            with open('highscores.txt', 'r') as file:
-                highscore = file.readlines()
-                highscore = [int(i.replace('\n', '')) for i in highscore]
-                highscore = str(max(highscore))
-        else:
-            highscore = '0'
+        audio.play_music()
+        main_menu(screen, audio)
+
+        highscore = str(highscores.get_highscore())
 
-        highscore_surface = write(font, highscore, (255, 255, 255))
         highscore_played = False
-        next_surface = write(font, "", (0, 0, 0))
-        grid = Grid(columns, rows, (TILESIZE, TILESIZE), resolution)
-        letter_move_time = 1
-        current_letter = FlyingLetter((TILESIZE, TILESIZE), grid.get_center_coord(), letter_move_time, randomizer)
-        next_letter = FlyingLetter((TILESIZE, TILESIZE), next_letter_coord, letter_move_time, randomizer)
+        grid = Grid(args.columns, args.rows, (tile_size, tile_size))
+        game = Game(grid)
+        recorder = Recorder(game)
+        renderer = Renderer(screen, game_background, grid, atlas, font, next_letter_coord, profiler,
+                            atlases[TILESIZE])
 
         clock = pygame.time.Clock()
-        total_time = 0.0
-        difficulty_level = 1
-        time_to_move = 1.0 / FPS
-        accumulator = 0.0
+        simulation_clock = SimulationClock()
         game_running = True
-        game_paused = drop_tetromino = False
+        game_paused = False
         while game_running:
-            screen.fill((0, 0, 0))
-            screen.blit(game_background, (0, 0))
-            counter = 1
+            profiler.start_frame()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     exit()
@@ -363,35 +525,30 @@ if __name__ == '__main__':
                     if event.key == pygame.K_ESCAPE:
                         game_running = False
                     elif event.key == pygame.K_RIGHT:
-                        sound['letter_move'].play()
-                        current_letter.move_right()
-                        if grid.is_out_of_bounds(current_letter.get_coords()) or \
-                                grid.collided(current_letter.get_coords()):
-                            current_letter.move_left()
+                        audio.play('letter_move')
+                        recorder.act(Game.MOVE_RIGHT)
                     elif event.key == pygame.K_LEFT:
-                        sound['letter_move'].play()
-                        current_letter.move_left()
-                        if grid.is_out_of_bounds(current_letter.get_coords()) or \
-                                grid.collided(current_letter.get_coords()):
-                            current_letter.move_right()
+                        audio.play('letter_move')
+                        recorder.act(Game.MOVE_LEFT)
                     elif event.key == pygame.K_DOWN:
-                        sound['rotate'].play()
-                        current_letter.rotate_ccw()
-                        # if letter collides or it is out of bounds undo rotate counterclockwise
-                        if grid.is_out_of_bounds(current_letter.get_coords()) or \
-                                grid.collided(current_letter.get_coords()):
-                            current_letter.rotate_cw()
+                        audio.play('rotate')
+                        recorder.act(Game.ROTATE_CCW)
                     elif event.key == pygame.K_UP:
-                        sound['rotate'].play()
-                        current_letter.rotate_cw()
-                        # if letter collides or it is out of bounds undo rotate clockwise
-                        if grid.is_out_of_bounds(current_letter.get_coords()) or \
-                                grid.collided(current_letter.get_coords()):
-                            current_letter.rotate_ccw()
+                        audio.play('rotate')
+                        recorder.act(Game.ROTATE_CW)
                     elif event.key == pygame.K_SPACE:
-                        current_letter.speed_up()
+                        recorder.act(Game.SPEED_UP)
+                    elif event.key == pygame.K_RETURN:
+                        recorder.act(Game.HARD_DROP)
+                    elif event.key == pygame.K_F3:
+                        profiler.toggle()
                     elif event.key == pygame.K_p:
-                        sound['pause'].play()
+                        audio.play('pause')
+                        audio.flush()
+                        pause_coord = grid.get_message_coord(write(font, 'PAUSE', (255, 255, 255)))
+                        renderer.set_text('pause', 'PAUSE', pause_coord)
+                        renderer.draw(game.current_letter, game.next_letter, game.get_ghost_cells())
+                        # sleep until an event comes, the screen is drawn again only if the window needs it
                         pause = True
                         while pause:
                             event = pygame.event.wait()
@@ -399,86 +556,70 @@ if __name__ == '__main__':
                                 pause = False
                             elif event.type == pygame.QUIT:
                                 exit()
-                            screen.blit(score_surface, score_coord)
-                            screen.blit(level_surface, level_coord)
-                            screen.blit(time_surface, time_coord)
-                            screen.blit(next_surface, next_coord)
-                            screen.blit(highscore_surface, highscore_coord)
-                            next_letter.show(screen, blocks)
-                            grid.show(screen, blocks)
-                            current_letter.show(screen, blocks)
-                            grid.display_message(screen, font, (255, 255, 255), 'PAUSE')
-                            pygame.display.flip()
-                            pygame.display.update()
+                            elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                                renderer.invalidate()
+                                renderer.draw(game.current_letter, game.next_letter, game.get_ghost_cells())
+                        renderer.remove_surface('pause')
                         game_paused = True
+                        profiler.drop_frame()
                 elif event.type == pygame.KEYUP:
                     if event.key == pygame.K_SPACE:
-                        current_letter.reset_speed()
-
+                        recorder.act(Game.RESET_SPEED)
+                elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                    # the window was covered, the whole screen is drawn on this frame
+                    renderer.invalidate()
+            profiler.mark('events')
+
+            frame_time = clock.tick(FPS)  # in milliseconds
+            profiler.mark('wait')
             if game_paused:
-                frame_time = time_to_move
+                # time spent in the pause doesn't count
+                frame_time = 0
                 game_paused = False
-                clock.tick(FPS)
-            else:
-                frame_time = clock.tick(FPS) / 500.0  # convert to seconds
-            accumulator += frame_time
-            while accumulator >= time_to_move and game_running:
-                while True:
-                    current_letter.move_down(time_to_move)
-                    collided = grid.collided(current_letter.get_coords())
-                    if not drop_tetromino or collided:
-                        drop_tetromino = False
-                        break
-
-                if collided:
-                    sound['letter_place'].play()
-                    current_letter.move_up()
-                    grid.update(current_letter.get_coords(), current_letter.get_color_index())
-                    # increase difficulty level every time 1500 points are claimed
-                    if grid.get_score() / 1500 >= difficulty_level:
-                        difficulty_level += 1
-                        letter_move_time *= DIFFICULTY
-
-                    current_letter = next_letter
-                    current_letter.set_coords(grid.get_center_coord())
-                    current_letter.set_speed(letter_move_time)
-                    next_letter = FlyingLetter((TILESIZE, TILESIZE), next_letter_coord, letter_move_time, randomizer)
-                game_running = not grid.is_game_over()
-                accumulator -= time_to_move
-            if grid.get_score() > int(highscore):
+            for i in range(simulation_clock.advance(frame_time)):
+                if not game_running:
+                    break
+                if game.tick():
+                    audio.play('letter_place')
+                game_running = not game.is_game_over()
+            if game.get_score() > int(highscore):
                 if not highscore_played:
-                    sound['new_highscore'].play()
+                    audio.play('new_highscore')
                     highscore_played = True
-                highscore = str(grid.get_score())
-                highscore_surface = write(font, highscore, (255, 255, 255))
-            total_time += frame_time
+                highscore = str(game.get_score())
+            # start the sounds of this frame together
+            audio.flush()
+            profiler.mark('simulation')
+            total_time = (game.ticks + simulation_clock.get_alpha()) / TICK_RATE
             time_string = "TIME " + '{0:02d}'.format(int(total_time // 60)) \
                           + ":" + '{0:02d}'.format(int(total_time % 60))
-            time_surface = write(font, time_string, (255, 255, 255))
-
-            score_string = str(grid.get_score())
-            score_surface = write(font, score_string, (255, 255, 255))
-            level_string = str(difficulty_level)
-            level_surface = write(font, level_string, (255, 255, 255))
-
-            screen.blit(score_surface, score_coord)
-            screen.blit(level_surface, level_coord)
-            screen.blit(time_surface, time_coord)
-            screen.blit(next_surface, next_coord)
-            screen.blit(highscore_surface, highscore_coord)
-            grid.show(screen, blocks)
+
+            renderer.set_text('score', str(game.get_score()), score_coord)
+            renderer.set_text('level', str(game.get_level()), level_coord)
+            renderer.set_text('time', time_string, time_coord)
+            renderer.set_text('highscore', highscore, highscore_coord)
+            if profiler.enabled:
+                renderer.set_surface('profiler', profiler.get_overlay(profiler_font), PROFILER_COORD)
+            else:
+                renderer.remove_surface('profiler')
+            profiler.mark('hud')
             if game_running:
-                current_letter.show(screen, blocks)
-            next_letter.show(screen, blocks)
-            pygame.display.flip()
-            clock.tick(FPS)
-            pygame.display.flip()
+                renderer.draw(game.current_letter, game.next_letter, game.get_ghost_cells())
+            else:
+                renderer.draw(None, game.next_letter)
 
-        sound['game_end'].play()
-        if os.path.isfile('highscores.txt'):
-            with open('highscores.txt', 'a') as file:
-                file.write(str(grid.get_score()) + '\n')
-        else:
-            with open('highscores.txt', 'w') as file:
-                file.write(str(grid.get_score()) + '\n')
-        pygame.mixer.music.stop()
+        audio.play('game_end')
+        audio.flush()
+        if not custom_board:
+            highscores.add(game.get_score())
+        audio.stop_music()
+        os.makedirs(REPLAYS_DIR, exist_ok=True)
+        recorder.save(os.path.join(REPLAYS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.trp'))
+        if profiler.frames:
+            os.makedirs(TRACES_DIR, exist_ok=True)
+            profiler.save_trace(os.path.join(TRACES_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json'))
+            profiler.frames.clear()
+
+
+if __name__ == '__main__':
+    main()
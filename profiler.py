@@ -0,0 +1,123 @@
+import json
+import time
+from collections import deque
+
+import pygame
+
+HISTORY = 3600  # frames kept for the overlay and the trace
+AVERAGE_FRAMES = 120  # frames the overlay averages the phases over
+BUCKET_MS = 2
+BUCKETS = 25  # histogram buckets, the last one also holds all the longer frames
+OVERLAY_SIZE = (220, 150)
+OVERLAY_UPDATE = 15  # frames between two redraws of the overlay
+OVERLAY_COLOR = (255, 255, 255)
+BUDGET_COLOR = (255, 80, 80)
+
+
+class Profiler:
+    # times the phases of every frame, while disabled every call returns at once
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        # (frame start, [(phase, start, end)])
+        self.frames = deque(maxlen=HISTORY)
+        self.phases = None  # phases of the current frame
+        self.last_time = 0
+        self.frames_count = 0
+        self.overlay = None
+        self.origin = time.perf_counter()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.phases = None
+        self.overlay = None
+
+    def start_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases = []
+        self.frames.append((now, self.phases))
+        self.frames_count += 1
+        self.last_time = now
+
+    def mark(self, phase):
+        # the phase started at the previous mark and ends now
+        if self.phases is None:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, self.last_time, now))
+        self.last_time = now
+
+    def drop_frame(self):
+        # forget the current frame, e.g. when it contains a pause
+        if self.phases is not None:
+            self.frames.pop()
+            self.phases = None
+
+    def get_frame_times(self):
+        # in milliseconds, frames that are still running are left out
+        return [(phases[-1][2] - start) * 1000 for start, phases in self.frames
+                if phases and phases is not self.phases]
+
+    def get_phase_times(self, frames_num=AVERAGE_FRAMES):
+        # phase -> average milliseconds per frame over the last frames
+        frames = [phases for start, phases in list(self.frames)[-frames_num - 1:] if phases is not self.phases]
+        totals = {}
+        for phases in frames:
+            for phase, start, end in phases:
+                totals[phase] = totals.get(phase, 0) + (end - start) * 1000
+        return {phase: total / len(frames) for phase, total in totals.items()}
+
+    def get_overlay(self, font, budget_ms=1000 / 60):
+        # the surface is drawn again every OVERLAY_UPDATE frames
+        if self.overlay is not None and self.frames_count % OVERLAY_UPDATE:
+            return self.overlay
+        overlay = pygame.Surface(OVERLAY_SIZE, pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 190))
+        width, height = OVERLAY_SIZE
+        frame_times = self.get_frame_times()
+
+        lines = []
+        if frame_times:
+            lines.append('FRAME {0:5.2f} MAX {1:5.2f}'.format(sum(frame_times) / len(frame_times),
+                                                             max(frame_times)))
+        for phase, phase_time in self.get_phase_times().items():
+            lines.append('{0:10} {1:5.2f}'.format(phase.upper(), phase_time))
+        y = 4
+        for line in lines:
+            text = font.render(line, True, OVERLAY_COLOR)
+            overlay.blit(text, (4, y))
+            y += text.get_height() + 2
+
+        # histogram of the frame times
+        buckets = [0] * BUCKETS
+        for frame_time in frame_times:
+            buckets[min(int(frame_time // BUCKET_MS), BUCKETS - 1)] += 1
+        bar_width = (width - 8) // BUCKETS
+        bars_height = height - y - 4
+        most = max(buckets) or 1
+        for index, count in enumerate(buckets):
+            bar_height = count * bars_height // most
+            if bar_height:
+                color = BUDGET_COLOR if index * BUCKET_MS >= budget_ms else OVERLAY_COLOR
+                pygame.draw.rect(overlay, color, (4 + index * bar_width, height - 4 - bar_height,
+                                                  bar_width - 1, bar_height))
+        self.overlay = overlay
+        return overlay
+
+    def get_trace(self):
+        # events of the Chrome trace viewer (chrome://tracing), times in microseconds
+        events = []
+        for start, phases in self.frames:
+            if not phases:
+                continue
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': (start - self.origin) * 1e6, 'dur': (phases[-1][2] - start) * 1e6})
+            for phase, phase_start, phase_end in phases:
+                events.append({'name': phase, 'ph': 'X', 'pid': 0, 'tid': 0,
+                               'ts': (phase_start - self.origin) * 1e6, 'dur': (phase_end - phase_start) * 1e6})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_trace(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.get_trace(), file)
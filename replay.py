@@ -0,0 +1,173 @@
+import argparse
+import struct
+import time
+
+from engine import Game, Grid, Randomizer
+from shapes import FlyingLetter
+
+# file layout: header, then one varint per input event: (ticks since the previous event << 3) | action
+MAGIC = b'TRPL'
+VERSION = 2
+HEADER = struct.Struct('<4sBQHHI')  # magic, version, seed, columns, rows, ticks
+
+SNAPSHOT_INTERVAL = 600  # ticks between board snapshots made during playback
+# ticks, score, lines, level, game over, letters count,
+# current letter angle, row, column, elapsed ticks, move ticks, normal move ticks
+SNAPSHOT = struct.Struct('<IIIHBIBhhIII')
+
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+class Recorder:
+    # records the input of a game, pass the actions through act() instead of Game.act()
+    def __init__(self, game):
+        self.game = game
+        self.seed = game.randomizer.seed
+        self.events = bytearray()
+        self.last_tick = 0
+
+    def act(self, action):
+        tick = self.game.ticks
+        write_varint(self.events, (tick - self.last_tick) << 3 | action)
+        self.last_tick = tick
+        return self.game.act(action)
+
+    def to_bytes(self):
+        grid = self.game.grid
+        return HEADER.pack(MAGIC, VERSION, self.seed, grid.columns, grid.rows, self.game.ticks) + bytes(self.events)
+
+    def save(self, filename):
+        with open(filename, 'wb') as file:
+            file.write(self.to_bytes())
+
+
+def make_snapshot(game):
+    grid = game.grid
+    letter = game.current_letter
+    state = SNAPSHOT.pack(game.ticks, grid.score, grid.lines, game.level, grid.game_over, game.letters_count,
+                          letter.current_angle, letter.row, letter.column,
+                          letter.elapsed_ticks, letter.move_ticks, letter.normal_move_ticks)
+    # one byte per cell, the color index shifted so that an empty cell is 0
+    cells = bytes(color_index + 1 for row in grid.grid for color_index in row)
+    return state + cells
+
+
+def restore_snapshot(game, snapshot):
+    (game.ticks, score, lines, game.level, game_over, letters_count,
+     angle, row, column, elapsed_ticks, move_ticks, normal_move_ticks) = SNAPSHOT.unpack_from(snapshot)
+    game.letter_move_ticks = game.get_move_ticks()
+    game.dropping = False
+
+    grid = game.grid
+    cells = snapshot[SNAPSHOT.size:]
+    for i in range(grid.rows):
+        grid.set_row(i, [color_index - 1 for color_index in cells[i * grid.columns:(i + 1) * grid.columns]])
+    grid.score = score
+    grid.lines = lines
+    grid.game_over = bool(game_over)
+
+    # replay the randomizer up to the two letters in play and build them again
+    game.randomizer = Randomizer(len(FlyingLetter.letters), game.randomizer.seed)
+    game.randomizer.generate(letters_count - 2)
+    game.letters_count = letters_count - 2
+    game.current_letter = game.new_letter()
+    game.next_letter = game.new_letter()
+
+    letter = game.current_letter
+    letter.current_angle = angle
+    letter.set_position((row, column))
+    letter.elapsed_ticks = elapsed_ticks
+    letter.normal_move_ticks = normal_move_ticks
+    letter.move_ticks = move_ticks
+
+
+class Player:
+    # re-simulates a recorded game without a display
+    def __init__(self, data, snapshot_interval=SNAPSHOT_INTERVAL):
+        magic, version, self.seed, self.columns, self.rows, self.ticks = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a replay file')
+
+        # list of (tick, action)
+        self.events = []
+        tick = 0
+        position = HEADER.size
+        while position < len(data):
+            value, position = read_varint(data, position)
+            tick += value >> 3
+            self.events.append((tick, value & 7))
+
+        self.snapshot_interval = snapshot_interval
+        self.game = Game(Grid(self.columns, self.rows), Randomizer(len(FlyingLetter.letters), self.seed))
+        self.event_index = 0
+        # tick -> (event index, snapshot)
+        self.snapshots = {0: (0, make_snapshot(self.game))}
+
+    @staticmethod
+    def load(filename, snapshot_interval=SNAPSHOT_INTERVAL):
+        with open(filename, 'rb') as file:
+            return Player(file.read(), snapshot_interval)
+
+    def is_finished(self):
+        return self.game.ticks >= self.ticks or self.game.is_game_over()
+
+    def step(self):
+        game = self.game
+        events = self.events
+        while self.event_index < len(events) and events[self.event_index][0] == game.ticks:
+            game.act(events[self.event_index][1])
+            self.event_index += 1
+        game.tick()
+        if game.ticks % self.snapshot_interval == 0 and game.ticks not in self.snapshots:
+            self.snapshots[game.ticks] = (self.event_index, make_snapshot(game))
+
+    def seek(self, tick):
+        tick = max(0, min(tick, self.ticks))
+        # start from the closest snapshot before the tick unless the game is already closer
+        start = tick - tick % self.snapshot_interval
+        while start not in self.snapshots:
+            start -= self.snapshot_interval
+        if not start <= self.game.ticks <= tick:
+            self.event_index, snapshot = self.snapshots[start]
+            restore_snapshot(self.game, snapshot)
+        while self.game.ticks < tick and not self.is_finished():
+            self.step()
+        return self.game
+
+    def run(self):
+        return self.seek(self.ticks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-simulate a recorded game without a display')
+    parser.add_argument('filename')
+    parser.add_argument('--seek', type=int, help='stop at this tick')
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    player = Player.load(args.filename)
+    game = player.run() if args.seek is None else player.seek(args.seek)
+    elapsed_time = time.perf_counter() - start_time
+    print('ticks', game.ticks, 'score', game.get_score(), 'level', game.get_level(),
+          'game over', game.is_game_over())
+    print('{0:.0f} ticks per second'.format(game.ticks / max(elapsed_time, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
@@ -136,101 +136,115 @@ class FlyingLetter:
     letters = (i_letter, o_letter, t_letter, j_letter,
                l_letter, s_letter, z_letter)
 
-    fast_move_time = 0.03  # in seconds
+    fast_move_ticks = 2  # 0.03 seconds at 60 ticks per second, rounded up
 
-    def __init__(self, block_dimensions, coord, move_time, randomizer):
+    def __init__(self, position, move_ticks, randomizer):
         self.random_index = randomizer.get_number()
-        self.random_letter = FlyingLetter.letters[self.random_index]
-
         self.current_angle = 0
-        self.current_frame = self.random_letter[self.current_angle]
-
-        self.block_width = block_dimensions[0]
-        self.block_height = block_dimensions[1]
 
-        # coordinates of the center block (required for the rotation)
-        self.center_coord = list(coord)
+        # grid indexes of the center block (required for the rotation)
+        self.row, self.column = position
 
-        # coordinates for each block of the letter
-        # list of coordinates [x, y]
-        self.blocks_coords = self.build()
+        # (row, column) of each block of the letter, built on demand
+        self.blocks_cells = None
 
-        # time in seconds
-        self.normal_move_time = move_time
-        self.move_time = self.normal_move_time
-        self.elapsed_time = 0.0
+        # time in simulation ticks
+        self.normal_move_ticks = move_ticks
+        self.move_ticks = self.normal_move_ticks
+        self.elapsed_ticks = 0
 
     def build(self):
-        x, y = [self.center_coord[0] - self.block_width, self.center_coord[1]
-                - self.block_height]
-        letter_coords = []
-
-        for i in range(len(self.current_frame)):
-            for char in self.current_frame[i]:
-                if char == '#':
-                    letter_coords.append([x, y])
-                x += self.block_width
-            x = self.center_coord[0] - self.block_width
-            y += self.block_height
-        return letter_coords
-
-    def set_coords(self, center_coord):
-        self.center_coord = list(center_coord)
-        self.blocks_coords = self.build()
-
-    def get_coords(self):
-        return self.blocks_coords
+        row, column = self.row, self.column
+        return [(row + i, column + j) for i, j in self.get_offsets()]
+
+    def get_offsets(self):
+        # (row, column) offsets of the blocks relative to the center block
+        return FlyingLetter.cells[self.random_index][self.current_angle]
+
+    def get_bottoms(self):
+        return FlyingLetter.bottoms[self.random_index][self.current_angle]
+
+    def get_state(self):
+        return self.random_index, self.current_angle, self.row, self.column
+
+    def set_position(self, position):
+        self.row, self.column = position
+        self.blocks_cells = None
+
+    def get_position(self):
+        return self.row, self.column
+
+    def get_cells(self):
+        if self.blocks_cells is None:
+            self.blocks_cells = self.build()
+        return self.blocks_cells
 
     def get_color_index(self):
         return self.random_index
 
     def speed_up(self):
-        self.move_time = FlyingLetter.fast_move_time
+        self.move_ticks = FlyingLetter.fast_move_ticks
 
     def reset_speed(self):
-        self.move_time = self.normal_move_time
+        self.move_ticks = self.normal_move_ticks
 
-    def set_speed(self, move_time):
-        self.normal_move_time = move_time
-        self.move_time = self.normal_move_time
+    def set_speed(self, move_ticks):
+        self.normal_move_ticks = move_ticks
+        self.move_ticks = self.normal_move_ticks
 
-    def show(self, screen, color_blocks):
-        for coord in self.blocks_coords:
-            screen.blit(color_blocks[self.random_index], coord)
+    def show(self, screen, color_blocks, coord):
+        # coord is the pixel position of the center block
+        block = color_blocks[self.random_index]
+        block_width, block_height = block.get_size()
+        for i, j in self.get_offsets():
+            screen.blit(block, (coord[0] + j * block_width, coord[1] + i * block_height))
 
     def move_up(self):
-        for coord in self.blocks_coords:
-            coord[1] -= self.block_height
-        self.center_coord[1] -= self.block_height
-
-    def move_down(self, time):
-        self.elapsed_time += time
-        if self.elapsed_time >= self.move_time:
-            self.elapsed_time = 0
-            for coord in self.blocks_coords:
-                coord[1] += self.block_height
-            self.center_coord[1] += self.block_height
+        self.row -= 1
+        self.blocks_cells = None
+
+    def move_down(self):
+        # called once per simulation tick
+        self.elapsed_ticks += 1
+        if self.elapsed_ticks >= self.move_ticks:
+            self.elapsed_ticks = 0
+            self.row += 1
+            self.blocks_cells = None
 
     def move_left(self):
-        self.center_coord[0] -= self.block_width
-        for coord in self.blocks_coords:
-            coord[0] -= self.block_width
+        self.column -= 1
+        self.blocks_cells = None
 
     def move_right(self):
-        self.center_coord[0] += self.block_width
-        for coord in self.blocks_coords:
-            coord[0] += self.block_width
+        self.column += 1
+        self.blocks_cells = None
 
     def rotate_ccw(self):
-        if self.current_angle == 0:
-            self.current_angle = 3
-        else:
-            self.current_angle -= 1
-
-        self.current_frame = self.random_letter[self.current_angle]
-        self.blocks_coords = self.build()
+        self.current_angle = (self.current_angle - 1) % 4
+        self.blocks_cells = None
 
     def rotate_cw(self):
         self.current_angle = (self.current_angle + 1) % 4
-        self.current_frame = self.random_letter[self.current_angle]
-        self.blocks_coords = self.build()
+        self.blocks_cells = None
+
+
+def compile_frame(frame):
+    # (row, column) offsets of the frame blocks relative to the center block
+    return tuple((i - 1, j - 1) for i, line in enumerate(frame)
+                 for j, char in enumerate(line) if char == '#')
+
+
+def get_bottoms(offsets):
+    # (column offset, lowest row offset) for every column of the frame
+    bottoms = {}
+    for i, j in offsets:
+        bottoms[j] = max(bottoms.get(j, i), i)
+    return tuple(sorted(bottoms.items()))
+
+
+# letter index -> angle -> block offsets, compiled once from the ascii frames
+FlyingLetter.cells = tuple(tuple(compile_frame(frame) for frame in letter)
+                           for letter in FlyingLetter.letters)
+# letter index -> angle -> lowest block of each column, used to find the landing row
+FlyingLetter.bottoms = tuple(tuple(get_bottoms(offsets) for offsets in letter)
+                             for letter in FlyingLetter.cells)
@@ -0,0 +1,25 @@
+import importlib
+import sys
+
+# command -> module with its main(argv), only play and versus import pygame
+COMMANDS = {'play': 'main',
+            'versus': 'versus',
+            'replay': 'replay',
+            'simulate': 'tournament',
+            'benchmark': 'benchmark',
+            'check-batch': 'batch'}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] not in COMMANDS:
+        print('usage: tetris.py {' + ','.join(COMMANDS) + '} [options]')
+        return 2
+    # the module is imported only now, so a headless command never loads pygame
+    module = importlib.import_module(COMMANDS[argv[0]])
+    return module.main(argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
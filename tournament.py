@@ -0,0 +1,75 @@
+import argparse
+import importlib
+import multiprocessing
+import time
+
+from engine import Game
+
+MAX_TICKS = 1000000
+
+
+def load_bot(name):
+    # 'module:function', e.g. 'bots:greedy_bot'
+    module_name, function_name = name.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def play_game(bot_name, seed, max_ticks=MAX_TICKS):
+    bot = load_bot(bot_name)
+    game = Game(seed=seed)
+    while not game.is_game_over() and game.ticks < max_ticks:
+        for action in bot(game):
+            game.act(action)
+        # let the letter fall until it is placed
+        while not game.tick() and game.ticks < max_ticks:
+            pass
+    return {'seed': seed, 'score': game.get_score(), 'lines': game.get_lines(),
+            'level': game.get_level(), 'ticks': game.ticks, 'letters': game.letters_count - 1}
+
+
+def play_game_args(args):
+    return play_game(*args)
+
+
+def run(bot_name, games, first_seed=0, processes=None, max_ticks=MAX_TICKS, callback=None):
+    # plays the games on all cores, callback gets each result as soon as its game is over
+    jobs = [(bot_name, seed, max_ticks) for seed in range(first_seed, first_seed + games)]
+    results = []
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(play_game_args, jobs):
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate a bot over many seeded games on all cores')
+    parser.add_argument('--bot', default='bots:greedy_bot', help='module:function of the bot')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--processes', type=int, help='worker processes, all cores by default')
+    parser.add_argument('--max-ticks', type=int, default=MAX_TICKS, help='stop a game after this many ticks')
+    parser.add_argument('--quiet', action='store_true', help="don't print every finished game")
+    args = parser.parse_args(argv)
+    if args.games < 1:
+        parser.error('--games must be at least 1')
+
+    def show(result):
+        if not args.quiet:
+            print('seed {seed}: score {score}, lines {lines}, level {level}, letters {letters}'.format(**result))
+
+    start_time = time.perf_counter()
+    results = run(args.bot, args.games, args.seed, args.processes, args.max_ticks, show)
+    elapsed_time = time.perf_counter() - start_time
+
+    scores = [result['score'] for result in results]
+    lines = [result['lines'] for result in results]
+    print('games: {0}, time: {1:.2f} s, {2:.1f} games per second'.format(
+        len(results), elapsed_time, len(results) / elapsed_time))
+    print('score: mean {0:.1f}, min {1}, max {2}'.format(sum(scores) / len(scores), min(scores), max(scores)))
+    print('lines: mean {0:.1f}, min {1}, max {2}'.format(sum(lines) / len(lines), min(lines), max(lines)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+import argparse
+import random
+
+import pygame
+
+from assets import assets
+from atlas import COLORKEY, TileAtlas
+from audio import Audio
+from engine import COLUMNS, ROWS, Game, SimulationClock
+from main import FPS, GHOST_COLOR, GHOST_WIDTH, Grid, write
+from shapes import FlyingLetter
+
+MAX_PLAYERS = 4
+TILESIZE = 24
+PREVIEW_TILESIZE = 16
+PANEL_WIDTH = 280  # every board gets a panel of the window
+BOARD_COORD = (20, 140)  # top left corner of the board in its panel
+NEXT_LETTER_COORD = (200, 60)  # center block of the next letter in the panel
+NAME_COORD = (20, 20)
+SCORE_COORD = (20, 50)
+LINES_COORD = (20, 80)
+WINDOW_HEIGHT = BOARD_COORD[1] + ROWS * TILESIZE + 20
+FRAME_COLOR = (255, 255, 255)
+TEXT_COLOR = (255, 255, 255)
+GARBAGE_COLOR = 1  # color index of the garbage blocks
+# lines cleared at once -> garbage rows sent to the next player
+GARBAGE = (0, 0, 1, 2, 4)
+
+# key -> action of every player, the speed up key gives RESET_SPEED when it is released
+KEYS = ({pygame.K_a: Game.MOVE_LEFT, pygame.K_d: Game.MOVE_RIGHT, pygame.K_w: Game.ROTATE_CW,
+         pygame.K_s: Game.ROTATE_CCW, pygame.K_LSHIFT: Game.SPEED_UP, pygame.K_SPACE: Game.HARD_DROP},
+        {pygame.K_LEFT: Game.MOVE_LEFT, pygame.K_RIGHT: Game.MOVE_RIGHT, pygame.K_UP: Game.ROTATE_CW,
+         pygame.K_DOWN: Game.ROTATE_CCW, pygame.K_RSHIFT: Game.SPEED_UP, pygame.K_RETURN: Game.HARD_DROP},
+        {pygame.K_j: Game.MOVE_LEFT, pygame.K_l: Game.MOVE_RIGHT, pygame.K_i: Game.ROTATE_CW,
+         pygame.K_k: Game.ROTATE_CCW, pygame.K_u: Game.SPEED_UP, pygame.K_o: Game.HARD_DROP},
+        {pygame.K_KP4: Game.MOVE_LEFT, pygame.K_KP6: Game.MOVE_RIGHT, pygame.K_KP8: Game.ROTATE_CW,
+         pygame.K_KP5: Game.ROTATE_CCW, pygame.K_KP0: Game.SPEED_UP, pygame.K_KP_ENTER: Game.HARD_DROP})
+# action -> sound
+ACTION_SOUNDS = {Game.MOVE_LEFT: 'letter_move', Game.MOVE_RIGHT: 'letter_move',
+                 Game.ROTATE_CW: 'rotate', Game.ROTATE_CCW: 'rotate'}
+
+
+class Board:
+    # one player: a grid, a game and the keys that drive it
+    def __init__(self, index, seed, keys, columns=COLUMNS, rows=ROWS):
+        self.index = index
+        self.x = index * PANEL_WIDTH
+        self.grid = Grid(columns, rows, (TILESIZE, TILESIZE),
+                         (self.x + BOARD_COORD[0], BOARD_COORD[1], columns * TILESIZE, rows * TILESIZE))
+        # the same seed on every board, so all players get the same letters
+        self.game = Game(self.grid, seed=seed)
+        self.keys = keys
+        # holes of the garbage rows
+        self.random = random.Random(seed * MAX_PLAYERS + index)
+        # garbage rows sent by the others, they come up when the next letter is placed
+        self.pending_garbage = 0
+
+    def act(self, action):
+        if self.game.is_game_over():
+            return False
+        return self.game.act(action)
+
+    def tick(self):
+        # returns the number of garbage rows to send, None if no letter was placed
+        if self.game.is_game_over() or not self.game.tick():
+            return None
+        lines = len(self.grid.cleared_rows)
+        attack = GARBAGE[min(lines, len(GARBAGE) - 1)]
+        # the cleared lines cancel the garbage that didn't come up yet
+        cancelled = min(attack, self.pending_garbage)
+        self.pending_garbage -= cancelled
+        attack -= cancelled
+        if self.pending_garbage and not lines:
+            self.grid.add_garbage(self.pending_garbage, self.random.randrange(self.grid.columns), GARBAGE_COLOR)
+            self.pending_garbage = 0
+        return attack
+
+
+class Match:
+    def __init__(self, players, seed=None, columns=COLUMNS, rows=ROWS):
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.boards = [Board(index, seed, KEYS[index], columns, rows) for index in range(players)]
+
+    def get_alive(self):
+        return [board for board in self.boards if not board.game.is_game_over()]
+
+    def is_finished(self):
+        # the last player standing wins, a single player plays until the game is over
+        return len(self.get_alive()) <= (1 if len(self.boards) > 1 else 0)
+
+    def get_winner(self):
+        alive = self.get_alive()
+        if len(self.boards) > 1 and len(alive) == 1:
+            return alive[0]
+        return None
+
+    def tick(self):
+        # advances every board by one tick, returns the boards that placed a letter
+        placed = []
+        for board in self.boards:
+            attack = board.tick()
+            if attack is None:
+                continue
+            placed.append(board)
+            if attack:
+                target = self.get_target(board)
+                if target is not None:
+                    target.pending_garbage += attack
+        return placed
+
+    def get_target(self, board):
+        # the next player still in the game
+        players = len(self.boards)
+        for k in range(1, players):
+            target = self.boards[(board.index + k) % players]
+            if not target.game.is_game_over():
+                return target
+        return None
+
+
+def make_ghost(atlas, index, angle):
+    # outlines of the cells of a letter, placed like the letter pictures of the atlas
+    letter, offset = atlas.letters[index][angle]
+    ghost = pygame.Surface(letter.get_size())
+    ghost.fill(COLORKEY)
+    ghost.set_colorkey(COLORKEY)
+    for i, j in FlyingLetter.cells[index][angle]:
+        rect = (j * atlas.size - offset[0], i * atlas.size - offset[1], atlas.size, atlas.size)
+        pygame.draw.rect(ghost, GHOST_COLOR, rect, GHOST_WIDTH)
+    return ghost
+
+
+class VersusRenderer:
+    # draws all boards in one pass: the changed parts of every board are collected,
+    # drawn with a single Surface.blits call and shown with a single display.update
+    LAYERS = ('ghost', 'letter', 'next', 'name', 'score', 'lines', 'message')
+
+    def __init__(self, screen, boards, atlas, preview_atlas, font):
+        self.screen = screen
+        self.boards = boards
+        self.atlas = atlas
+        self.preview_atlas = preview_atlas
+        self.font = font
+
+        # the frames of the boards never change
+        self.static = pygame.Surface(screen.get_size()).convert()
+        self.static.fill((0, 0, 0))
+        for board in boards:
+            grid = board.grid
+            frame = pygame.Rect(grid.min_coord, (grid.area_width, grid.area_height)).inflate(6, 6)
+            pygame.draw.rect(self.static, FRAME_COLOR, frame, 2)
+            board.grid.init_surface(atlas, self.static)
+        self.ghosts = {}  # (letter index, angle) -> outline picture
+        # (layer, board index) -> (state, surface, rect) of everything drawn over the boards
+        self.items = {}
+        self.dirty = []
+        self.invalidate()
+
+    def invalidate(self):
+        self.dirty = [self.screen.get_rect()]
+
+    def get_ghost(self, index, angle):
+        ghost = self.ghosts.get((index, angle))
+        if ghost is None:
+            ghost = self.ghosts[(index, angle)] = make_ghost(self.atlas, index, angle)
+        return ghost
+
+    def set_item(self, layer, board, state, surface=None, coord=None):
+        # state tells whether the item changed, a None surface removes it
+        key = (self.LAYERS.index(layer), board.index)
+        item = self.items.get(key)
+        if item is not None:
+            if item[0] == state:
+                return
+            self.dirty.append(item[2])
+        if surface is None:
+            self.items.pop(key, None)
+            return
+        rect = surface.get_rect(topleft=coord)
+        self.dirty.append(rect)
+        self.items[key] = (state, surface, rect)
+
+    def set_text(self, layer, board, message, coord):
+        item = self.items.get((self.LAYERS.index(layer), board.index))
+        if item is None or item[0] != message:
+            self.set_item(layer, board, message, write(self.font, message, TEXT_COLOR), coord)
+
+    def update_board(self, board, message=None):
+        game = board.game
+        grid = board.grid
+        if not game.is_game_over():
+            letter = game.current_letter
+            index, angle = letter.get_color_index(), letter.current_angle
+            picture, (offset_x, offset_y) = self.atlas.letters[index][angle]
+            x, y = grid.convert_indexes([letter.get_position()])[0]
+            self.set_item('letter', board, letter.get_state(), picture, (x + offset_x, y + offset_y))
+            landing_row = game.get_landing_row()
+            x, y = grid.convert_indexes([(landing_row, letter.column)])[0]
+            self.set_item('ghost', board, (index, angle, landing_row, letter.column),
+                          self.get_ghost(index, angle), (x + offset_x, y + offset_y))
+        else:
+            self.set_item('letter', board, None)
+            self.set_item('ghost', board, None)
+
+        next_letter = game.next_letter
+        index, angle = next_letter.get_color_index(), next_letter.current_angle
+        picture, (offset_x, offset_y) = self.preview_atlas.letters[index][angle]
+        self.set_item('next', board, (index, angle), picture,
+                      (board.x + NEXT_LETTER_COORD[0] + offset_x, NEXT_LETTER_COORD[1] + offset_y))
+
+        self.set_text('name', board, 'P' + str(board.index + 1), (board.x + NAME_COORD[0], NAME_COORD[1]))
+        self.set_text('score', board, str(game.get_score()), (board.x + SCORE_COORD[0], SCORE_COORD[1]))
+        self.set_text('lines', board, 'LINES ' + str(game.get_lines()), (board.x + LINES_COORD[0], LINES_COORD[1]))
+        if message is None:
+            self.set_item('message', board, None)
+        else:
+            text = write(self.font, message, TEXT_COLOR)
+            self.set_item('message', board, message, text, grid.get_message_coord(text))
+
+        rect = grid.get_dirty_rect()
+        if rect is not None:
+            self.dirty.append(rect)
+
+    def draw(self, messages=None):
+        # messages: board index -> text shown over the board
+        for board in self.boards:
+            self.update_board(board, messages.get(board.index) if messages else None)
+        rects = self.dirty
+        if not rects:
+            return
+        items = [self.items[key] for key in sorted(self.items)]
+        blits = []
+        for rect in rects:
+            blits.append((self.static, rect.topleft, rect))
+            for board in self.boards:
+                grid = board.grid
+                area = rect.clip(grid.rect)
+                if area:
+                    blits.append((grid.surface, area.topleft, area.move(-grid.rect.x, -grid.rect.y)))
+            for state, surface, item_rect in items:
+                area = rect.clip(item_rect)
+                if area:
+                    blits.append((surface, area.topleft, area.move(-item_rect.x, -item_rect.y)))
+        self.screen.blits(blits, doreturn=False)
+        pygame.display.update(rects)
+        self.dirty = []
+
+
+def play(screen, players, seed=None, audio=None):
+    # returns True to play again
+    match = Match(players, seed)
+    font = assets.font('PressStart2P.ttf', 16)
+    atlas = TileAtlas(assets, TILESIZE)
+    preview_atlas = TileAtlas(assets, PREVIEW_TILESIZE)
+    renderer = VersusRenderer(screen, match.boards, atlas, preview_atlas, font)
+
+    clock = pygame.time.Clock()
+    simulation_clock = SimulationClock()
+    messages = {}
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    return False
+                if match.is_finished():
+                    if event.key == pygame.K_RETURN:
+                        return True
+                    continue
+                for board in match.boards:
+                    action = board.keys.get(event.key)
+                    if action is not None and board.act(action) and audio is not None and action in ACTION_SOUNDS:
+                        audio.play(ACTION_SOUNDS[action])
+            elif event.type == pygame.KEYUP:
+                for board in match.boards:
+                    if board.keys.get(event.key) == Game.SPEED_UP:
+                        board.act(Game.RESET_SPEED)
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                renderer.invalidate()
+
+        frame_time = clock.tick(FPS)
+        if not match.is_finished():
+            for i in range(simulation_clock.advance(frame_time)):
+                if match.tick() and audio is not None:
+                    audio.play('letter_place')
+                if match.is_finished():
+                    if audio is not None:
+                        audio.play('game_end')
+                    winner = match.get_winner()
+                    for board in match.boards:
+                        messages[board.index] = 'WINNER' if board is winner else 'GAME OVER'
+                    break
+        if audio is not None:
+            audio.flush()
+        renderer.draw(messages)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local versus mode, 2 to 4 players on one keyboard')
+    parser.add_argument('--players', type=int, default=2, choices=range(1, MAX_PLAYERS + 1))
+    parser.add_argument('--seed', type=int, help='seed of the letters, random by default')
+    args = parser.parse_args(argv)
+
+    pygame.mixer.pre_init(44100, -16, 1, 512)
+    pygame.display.init()
+    pygame.font.init()
+    pygame.mixer.init()
+    assets.preload(background=True)
+    screen = pygame.display.set_mode((args.players * PANEL_WIDTH, WINDOW_HEIGHT))
+    pygame.display.set_caption('Tetris versus')
+    pygame.key.set_repeat(100, 70)
+    assets.wait()
+    audio = Audio(assets)
+    audio.play_music()
+
+    seed = args.seed
+    while play(screen, args.players, seed, audio):
+        if seed is not None:
+            seed += 1
+
+
+if __name__ == '__main__':
+    main()